@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import numpy as np
+
+# benchmark.py
+# End-to-end benchmark of the API with local stand-ins, no API keys or network:
+#   transcription -> TRANSCRIPTION_ENGINE=local (audio bytes are the command text)
+#   LLM           -> llm_stub_server.py on a local port (configurable latency)
+#   MongoDB       -> in-memory mongomock (default) or --mongo-uri for a local server;
+#                    mongomock needs requirements-dev.txt and its numbers are not
+#                    comparable with a real server (results say which one was used)
+#   embeddings    -> EMBEDDING_BACKEND=hash (default) or torch/onnx for the real model
+# Seeds a synthetic catalog and users, drives every endpoint concurrently through
+# the ASGI app, and reports throughput and p50/p95/p99 per endpoint and per
+# pipeline stage (timing.py).
+#
+#   python benchmark.py --products 2000 --users 200 --requests 500 --concurrency 32
+#   python benchmark.py --save-baseline        # store results in benchmarks/baseline.json
+#   python benchmark.py --fail-on-regression   # exit 1 if slower than the baseline
+
+CATEGORIES = {
+    "dairy": ["Milk", "Cheese", "Yogurt", "Butter", "Paneer", "Cream"],
+    "fruit": ["Apple", "Banana", "Orange", "Mango", "Grapes", "Papaya"],
+    "drinks": ["Cola", "Juice", "Water", "Tea", "Coffee", "Lemonade"],
+    "snacks": ["Chips", "Cookies", "Popcorn", "Nachos", "Pretzels", "Candy"],
+    "grains": ["Rice", "Flour", "Oats", "Barley", "Quinoa", "Millets"],
+    "kitchen": ["Pan", "Knife", "Spatula", "Bottle", "Board", "Box"],
+}
+BRANDS = ["Fresh", "Daily", "Golden", "Green", "Royal", "Happy", "Nature", "Prime", "Farm", "City",
+          "Sunny", "Pure", "Classic", "Urban", "Organic", "Value"]
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+
+
+def mongo_backend(mongo_uri: str) -> str:
+    if mongo_uri.startswith("mongomock://"):
+        return "in-memory mongomock (blocking, no network): not comparable with a MongoDB server"
+    return "MongoDB server"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end API benchmark with local stand-ins")
+    parser.add_argument("--products", type=int, default=2000, help="synthetic catalog size")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--wishlist-size", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--llm-fraction", type=float, default=0.3, help="share of commands the local parser can't handle")
+    parser.add_argument("--transcription-latency", type=float, default=0.05)
+    parser.add_argument("--embedder", default="hash", choices=("hash", "torch", "onnx"))
+    parser.add_argument("--mongo-uri", default="mongomock://", help="local MongoDB; the benchmark database is dropped")
+    parser.add_argument("--llm-port", type=int, default=5099)
+    parser.add_argument("--scenarios", nargs="+", help="run only these scenarios")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before flagging")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's request logging")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Must run before the app modules are imported: they read their config at import time."""
+    os.environ.update({
+        "MONGO_URI": args.mongo_uri,
+        "MONGO_DB_NAME": "wishlist_benchmark",
+        "TRANSCRIPTION_ENGINE": "local",
+        "LOCAL_TRANSCRIPTION_LATENCY": str(args.transcription_latency),
+        "GROQ_API_URL": f"http://127.0.0.1:{args.llm_port}/openai/v1/chat/completions",
+        "GROQ_API_KEY": "benchmark",
+        "EMBEDDING_BACKEND": args.embedder,
+        "EMBEDDING_CACHE_PATH": "",
+        "ML_LOAD_MODE": "background",
+    })
+    os.environ.pop("ML_SERVICE_SOCKET", None)
+    os.environ.pop("STORE_INDEX_DIR", None)
+
+
+# ===================== DATA =======================
+def synthetic_catalog(size: int, rng: random.Random) -> list:
+    names = [(f"{brand} {item}", category)
+             for category, items in CATEGORIES.items() for item in items for brand in BRANDS]
+    rng.shuffle(names)
+    products = []
+    for i in range(size):
+        name, category = names[i % len(names)]
+        if i >= len(names):
+            name = f"{name} {i // len(names) + 1}"
+        products.append({"product": name, "category": category, "price": rng.randint(10, 500),
+                         "quantity": 1_000_000})
+    return products
+
+
+def seed(args, rng: random.Random) -> dict:
+    import datetime
+    import db
+
+    db.client.drop_database(db.DB_NAME)
+    products = synthetic_catalog(args.products, rng)
+    now = datetime.datetime.utcnow()
+    db.store_collection.insert_many(
+        [{**p, "product_key": db.product_key(p["product"]), "updated_at": now} for p in products]
+    )
+
+    users = [f"bench_user_{i}" for i in range(args.users)]
+    wishlists = {username: rng.sample(products, min(args.wishlist_size, len(products))) for username in users}
+    db.user_collection.insert_many([{
+        "username": username,
+        "wishlist_rev": 1,
+        "wishlist": [{"product": p["product"], "quantity": 1, "reserved": 0, "category": p["category"],
+                      "action": "add", "status": "seeded", "timestamp": now.isoformat()}
+                     for p in wishlists[username]],
+    } for username in users])
+    return {"products": products, "users": users, "wishlists": wishlists}
+
+
+def commands(data: dict, count: int, llm_fraction: float, rng: random.Random) -> list:
+    """Mix of commands the local parser resolves (one or several items) and phrasings only the LLM handles."""
+    result = []
+    for _ in range(count):
+        first, second = rng.sample(data["products"], 2)
+        roll = rng.random()
+        if roll < llm_fraction:
+            result.append(f"could you get me {rng.randint(2, 5)} {first['product']}")
+        elif roll < llm_fraction + (1 - llm_fraction) / 4:
+            result.append(f"I need {first['product']} and {rng.randint(2, 5)} {second['product']}")
+        else:
+            result.append(f"add {rng.randint(1, 5)} {first['product']} to my list")
+    return result
+
+
+# ===================== SCENARIOS =======================
+def build_scenarios(data: dict, args, rng: random.Random) -> dict:
+    users, products = data["users"], data["products"]
+    added = {}
+    spoken = commands(data, args.requests, args.llm_fraction, rng)
+
+    def action(product: dict, kind: str) -> dict:
+        return {"product": product["product"], "quantity": 1, "category": product["category"],
+                "action": kind, "status": "benchmark"}
+
+    async def recognise(client, i):
+        return await client.post("/recognise_text_to_llm", files={"file": ("audio.webm", spoken[i].encode())})
+
+    async def wishlist_add(client, i):
+        added[i] = rng.choice(products)
+        return await client.post(f"/update_wishlist/{users[i % len(users)]}", json=action(added[i], "add"))
+
+    async def wishlist_remove(client, i):
+        # Undoes wishlist_add's i-th request (same user), so every remove hits a real line
+        username = users[i % len(users)]
+        product = added.get(i) or data["wishlists"][username][0]
+        return await client.post(f"/update_wishlist/{username}", json=action(product, "remove"))
+
+    async def wishlist_batch(client, i):
+        # A multi-item command: add three products and take one back in one request
+        picked = rng.sample(products, 3)
+        commands = [action(product, "add") for product in picked] + [action(picked[0], "remove")]
+        return await client.post(f"/update_wishlist/{users[i % len(users)]}/batch", json={"commands": commands})
+
+    async def get_wishlist(client, i):
+        return await client.get(f"/wishlist/{users[i % len(users)]}")
+
+    async def recommendations(client, i):
+        return await client.get(f"/recommendations/{users[i % len(users)]}")
+
+    etags = {}
+
+    async def recommendations_revalidate(client, i):
+        # Frontend behaviour: re-fetch with If-None-Match, mostly answered with 304
+        username = users[i % len(users)]
+        headers = {"If-None-Match": etags[username]} if username in etags else {}
+        response = await client.get(f"/recommendations/{username}", headers=headers)
+        if "etag" in response.headers:
+            etags[username] = response.headers["etag"]
+        return response
+
+    async def history(client, i):
+        return await client.get(f"/history/{users[i % len(users)]}?limit=20")
+
+    return {
+        "recognise": recognise,
+        "wishlist_add": wishlist_add,
+        "wishlist_remove": wishlist_remove,
+        "wishlist_batch": wishlist_batch,
+        "get_wishlist": get_wishlist,
+        "recommendations_cold": recommendations,
+        "recommendations_warm": recommendations,
+        "recommendations_revalidate": recommendations_revalidate,
+        "history": history,
+    }
+
+
+async def run_scenario(client, request, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    next_index = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                response = await request(client, i)
+                body = response.json() if response.status_code != 304 else None
+                failed = response.status_code >= 400 or (isinstance(body, dict) and "error" in body)
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+# ===================== REPORTING =======================
+def summarize(latencies: list, duration: float = None, errors: int = 0) -> dict:
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    summary = {
+        "count": len(latencies),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+    if duration is not None:
+        summary["errors"] = errors
+        summary["throughput_rps"] = round(len(latencies) / duration, 1) if duration else 0.0
+    return summary
+
+
+def print_results(results: dict):
+    print(f"\nMongoDB: {results.get('mongo_backend', 'unknown')}")
+    print(f"\n{'scenario / stage':<34}{'count':>7}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, scenario in results["scenarios"].items():
+        print(f"{name:<34}{scenario['count']:>7}{scenario['errors']:>6}{scenario['throughput_rps']:>9.1f}"
+              f"{scenario['p50_ms']:>10.2f}{scenario['p95_ms']:>10.2f}{scenario['p99_ms']:>10.2f}")
+        for stage, summary in results["stages"].get(name, {}).items():
+            print(f"  {stage:<32}{summary['count']:>7}{'':>6}{'':>9}"
+                  f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        # 1 ms floor so sub-millisecond noise on fast endpoints isn't flagged
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and current["p95_ms"] - base["p95_ms"] > 1:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+# ===================== MAIN =======================
+async def run(args) -> dict:
+    import httpx
+    import llm_stub_server
+    import main as app_module
+    import timing
+
+    llm_stub_server.settings["latency"] = args.llm_latency
+    stub = llm_stub_server.run_in_thread(port=args.llm_port)
+
+    rng = random.Random(args.seed)
+    data = seed(args, rng)
+    scenarios = build_scenarios(data, args, rng)
+    if args.scenarios:
+        scenarios = {name: fn for name, fn in scenarios.items() if name in args.scenarios}
+
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "fail_on_regression",
+                                                                          "baseline", "scenarios", "verbose")},
+               "mongo_backend": mongo_backend(args.mongo_uri), "scenarios": {}, "stages": {}}
+    try:
+        async with app_module.lifespan(app_module.app):
+            started = time.perf_counter()
+            if not await asyncio.to_thread(app_module.ml.wait, 600):
+                raise RuntimeError(f"ML components failed to load: {app_module.ml.status()}")
+            print(f"Seeded {len(data['products'])} products / {len(data['users'])} users; "
+                  f"ML ready after {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+                for name, request in scenarios.items():
+                    if name == "recommendations_cold":
+                        app_module.recommendation_cache.clear()
+                    timing.reset()
+                    latencies, errors, duration = await run_scenario(client, request, args.requests, args.concurrency)
+                    results["scenarios"][name] = summarize(latencies, duration, errors)
+                    results["stages"][name] = {stage: summarize(values) for stage, values in timing.samples().items()}
+                    print(f"  {name}: {args.requests} requests done", file=sys.stderr)
+    finally:
+        stub.should_exit = True
+    return results
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    if args.verbose:
+        results = asyncio.run(run(args))
+    else:
+        # The app logs every request; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results = asyncio.run(run(args))
+    print_results(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("mongo_backend") != results["mongo_backend"]:
+            print(f"\n⚠️ Baseline MongoDB: {baseline.get('mongo_backend', 'unknown')}")
+        if baseline.get("config") != results["config"]:
+            print("\n⚠️ Baseline was recorded with different settings; comparison is approximate")
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for regression in regressions:
+                print("  " + regression)
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print(f"\n✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from db import store_collection, product_key, backfill_product_keys
+
+# catalog_import.py
+# Bulk store catalog import: streams CSV/JSONL feeds of any size, validates rows,
+# upserts them with one bulk_write per batch (keyed by product_key), and warms the
+# embedding cache so the server's store index build doesn't run the model again.
+#
+#   python catalog_import.py feed.csv more.jsonl --batch-size 2000
+#
+# CSV needs a header with product, category, price, quantity. JSONL is one object per line.
+
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+# ===================== READING =======================
+def iter_rows(path: str):
+    """Yield (line number, raw row dict) without loading the file into memory."""
+    if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, RowError(f"invalid JSON: {e.msg}")
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            # line 1 is the header
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+
+def validate_row(row) -> dict:
+    """Return the store document for a raw row, or raise RowError."""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("row is not an object")
+
+    name = " ".join(str(row.get("product") or "").split())
+    if not name:
+        raise RowError("missing product")
+    category = " ".join(str(row.get("category") or "").split()).lower() or "unknown"
+
+    try:
+        price = float(row.get("price"))
+    except (TypeError, ValueError):
+        raise RowError(f"invalid price {row.get('price')!r}")
+    try:
+        quantity = int(float(row.get("quantity", 0) or 0))
+    except (TypeError, ValueError):
+        raise RowError(f"invalid quantity {row.get('quantity')!r}")
+    if price < 0 or quantity < 0:
+        raise RowError("price and quantity must not be negative")
+
+    return {
+        "product": name,
+        "product_key": product_key(name),
+        "category": category,
+        "price": int(price) if price.is_integer() else price,
+        "quantity": quantity,
+    }
+
+
+# ===================== WRITING =======================
+def upsert_batch(collection, docs: list, insert_only: bool = False):
+    """
+    One bulk_write for the batch. insert_only leaves existing products untouched
+    (what seed_store.py wants); otherwise rows overwrite category/price/quantity.
+    updated_at lets a running store index pick the changes up.
+    """
+    # Last row wins when a feed repeats a product inside one batch
+    by_key = {doc["product_key"]: doc for doc in docs}
+    now = datetime.datetime.utcnow()
+    ops = []
+    for key, doc in by_key.items():
+        if insert_only:
+            update = {"$setOnInsert": {**doc, "updated_at": now}}
+        else:
+            update = {"$set": {**doc, "updated_at": now}}
+        ops.append(UpdateOne({"product_key": key}, update, upsert=True))
+    return collection.bulk_write(ops, ordered=False)
+
+
+def load_embedding_cache():
+    from embedders import create_embedder
+    from embedding_cache import EmbeddingCache
+
+    # Same backend (EMBEDDING_BACKEND) as the server, so it finds these vectors.
+    # Vectors go to SQLite; keep the in-memory tier small during a big import
+    embedder = create_embedder(batching=False)  # one caller, already batched
+    return EmbeddingCache(embedder, embedder.name, path=EMBEDDING_CACHE_PATH, max_memory_items=10000)
+
+
+def import_rows(rows, collection=store_collection, batch_size: int = 1000, insert_only: bool = False,
+                embedding_cache=None) -> dict:
+    """
+    rows: iterable of (source, raw row). Embeddings for batch N are computed on a
+    worker thread while batch N+1 is validated and written.
+    Returns the import report.
+    """
+    report = {"rows": 0, "valid": 0, "invalid": 0, "inserted": 0, "updated": 0, "errors": []}
+    started = time.perf_counter()
+    # Products seeded before product_key existed would not match the upserts below
+    backfilled = backfill_product_keys(collection)
+    if backfilled:
+        print(f"Backfilled product_key on {backfilled} existing products")
+    pending_embeddings = None
+
+    with ThreadPoolExecutor(max_workers=1) as embed_pool:
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, batch_size))
+            if not chunk:
+                break
+
+            docs = []
+            for source, row in chunk:
+                report["rows"] += 1
+                try:
+                    docs.append(validate_row(row))
+                except RowError as e:
+                    report["invalid"] += 1
+                    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                        report["errors"].append(f"{source}: {e}")
+            if not docs:
+                continue
+
+            report["valid"] += len(docs)
+            result = upsert_batch(collection, docs, insert_only=insert_only)
+            report["inserted"] += result.upserted_count
+            report["updated"] += result.modified_count
+
+            if embedding_cache is not None:
+                if pending_embeddings is not None:
+                    pending_embeddings.result()
+                pending_embeddings = embed_pool.submit(embedding_cache.encode, [d["product"] for d in docs])
+
+        if pending_embeddings is not None:
+            pending_embeddings.result()
+
+    report["seconds"] = time.perf_counter() - started
+    report["rows_per_second"] = report["rows"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+
+def import_files(paths: list, **kwargs) -> dict:
+    rows = ((f"{path}:{line_no}", row) for path in paths for line_no, row in iter_rows(path))
+    return import_rows(rows, **kwargs)
+
+
+def print_report(report: dict):
+    for error in report["errors"]:
+        print(f"⚠️ Skipped {error}")
+    if report["invalid"] > len(report["errors"]):
+        print(f"⚠️ ... and {report['invalid'] - len(report['errors'])} more invalid rows")
+    print(
+        f"✅ {report['valid']}/{report['rows']} rows imported "
+        f"({report['inserted']} new, {report['updated']} updated, {report['invalid']} invalid) "
+        f"in {report['seconds']:.2f}s — {report['rows_per_second']:.0f} rows/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import store products from CSV/JSONL files")
+    parser.add_argument("paths", nargs="+", help="CSV (with header) or JSONL files")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--insert-only", action="store_true", help="don't overwrite products that already exist")
+    parser.add_argument("--no-embeddings", action="store_true", help="skip warming the embedding cache")
+    args = parser.parse_args()
+
+    report = import_files(
+        args.paths,
+        batch_size=args.batch_size,
+        insert_only=args.insert_only,
+        embedding_cache=None if args.no_embeddings else load_embedding_cache(),
+    )
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
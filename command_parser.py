@@ -0,0 +1,155 @@
+import os
+import re
+from product_resolver import store_resolver
+
+# command_parser.py
+# Deterministic parser for simple shopping commands ("add 2 kg of rice to list",
+# "remove the apples from my list"). Produces the same dict that
+# validate_llm_response checks, with product and category taken from the store
+# catalog. Returns None whenever it isn't confident, so the caller can fall back
+# to the LLM (prompt.process_command).
+
+MIN_CONFIDENCE = float(os.getenv("LOCAL_PARSER_MIN_CONFIDENCE", "0.85"))
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30,
+    "forty": 40, "fifty": 50, "dozen": 12, "couple": 2, "pair": 2,
+}
+
+UNITS = {
+    "kg", "kgs", "kilo", "kilos", "kilogram", "kilograms", "g", "gm", "gms", "gram", "grams",
+    "l", "ltr", "liter", "liters", "litre", "litres", "ml", "packet", "packets", "pack",
+    "packs", "bottle", "bottles", "can", "cans", "box", "boxes", "bag", "bags", "piece",
+    "pieces", "pcs", "loaf", "loaves", "bunch", "bunches", "jar", "jars", "carton", "cartons",
+}
+
+FILLERS = {"of", "some", "more", "the", "my", "please", "x"}
+
+ADD_PATTERN = re.compile(
+    r"^(?:please\s+)?(?:i\s+(?:want\s+to\s+buy|would\s+like|want|need)|add|put|include|buy|get)\s+(.+)$"
+)
+REMOVE_PATTERN = re.compile(r"^(?:please\s+)?(remove|delete|take\s+out)\s+(.+)$")
+LIST_PHRASE = r"\s+(?:to|from|in|into|on|off|onto)\s+(?:my\s+|the\s+)?(?:shopping\s+)?(?:list|cart|wishlist)\b"
+# Only at the very end: "add milk to my list and bread" still has an item after it
+# (repeated: normalize_user_text appends its own "to list" to "... to my list please")
+LIST_SUFFIX = re.compile(r"(?:" + LIST_PHRASE + r"(?:\s+please)?)+$")
+INNER_LIST_PHRASE = re.compile(LIST_PHRASE)
+
+
+def split_intent(text: str):
+    """Return (action, rest of command) or (None, None) if it isn't an add/remove command."""
+    text = " ".join(text.lower().replace(",", " , ").split())
+    match = REMOVE_PATTERN.match(text)
+    if match:
+        action = "delete" if match.group(1) == "delete" else "remove"
+        return action, match.group(2)
+    match = ADD_PATTERN.match(text)
+    if match:
+        return "add", match.group(1)
+    return None, None
+
+
+def parse_quantity(tokens: list):
+    """Consume a leading quantity ("2", "two", "a dozen", "couple of") plus unit; return (quantity, remaining tokens)."""
+    quantity = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if re.fullmatch(r"\d+", token):
+            value = int(token)
+        elif token in NUMBER_WORDS:
+            value = NUMBER_WORDS[token]
+        else:
+            break
+        # "a dozen", "two dozen" multiply; plain numbers replace
+        if quantity is not None and token == "dozen":
+            quantity *= value
+        elif quantity is not None:
+            break
+        else:
+            quantity = value
+        i += 1
+
+    while i < len(tokens) and (tokens[i] in UNITS or tokens[i] in FILLERS):
+        i += 1
+    return (quantity if quantity is not None else 1), tokens[i:]
+
+
+def parse_command(text: str, resolver=store_resolver):
+    """
+    Parse a normalized command locally.
+    Returns (llm_response-shaped dict, confidence 0-1), or (None, 0.0) if the
+    text doesn't fit the grammar.
+    """
+    action, rest = split_intent(text or "")
+    if not action:
+        return None, 0.0
+
+    rest = LIST_SUFFIX.sub("", rest)
+    if INNER_LIST_PHRASE.search(rest):
+        return None, 0.0  # more words after "to my list": several items, or not a simple command
+    tokens = [t for t in rest.split() if t]
+    quantity, tokens = parse_quantity(tokens)
+    while tokens and tokens[-1] in FILLERS:
+        tokens = tokens[:-1]
+
+    if not tokens or quantity < 1:
+        return None, 0.0
+
+    item, score = resolver.match(" ".join(tokens))
+    # Several items in one command ("milk and two apples") are split by parse_items,
+    # unless the whole phrase is a product name ("salt and pepper chips")
+    if not item or (("and" in tokens or "," in tokens) and score < 100 * MIN_CONFIDENCE):
+        return None, 0.0
+
+    return {
+        "product": item["product"],
+        "quantity": quantity,
+        "category": item.get("category", "unknown"),
+        "action": action,
+        "status": "locally_parsed",
+    }, score / 100.0
+
+
+def split_items(text: str, resolver=store_resolver):
+    """
+    Split a multi-item command ("add milk, two apples and bread to my list") into
+    (action, ["milk", "two apples", "bread"]). A single item, or a name that is
+    itself a catalog product ("salt and pepper chips"), gives a one-element list;
+    (None, []) if it isn't an add/remove command.
+    """
+    action, rest = split_intent(text or "")
+    if not action:
+        return None, []
+    rest = LIST_SUFFIX.sub("", rest)
+
+    _, whole_score = resolver.match(rest)
+    if whole_score >= 100 * MIN_CONFIDENCE:
+        return action, [rest]
+
+    segments = re.split(r"\s*,\s*|\s+and\s+", rest)
+    # Each segment may carry its own "to my list"
+    segments = [LIST_SUFFIX.sub("", s.strip()) for s in segments]
+    return action, [s for s in segments if s and s not in ("and", ",")]
+
+
+def parse_items(text: str, resolver=store_resolver):
+    """
+    Local parse of every item in a multi-item command.
+    Returns (action, [(segment command text, parsed dict or None), ...]); None
+    entries are segments the caller should send to the LLM one by one.
+    """
+    action, segments = split_items(text, resolver)
+    commands = [f"{action} {segment}" for segment in segments]
+    return action, [(command, parse_locally(command, resolver)) for command in commands]
+
+
+def parse_locally(text: str, resolver=store_resolver):
+    """Fast path: the parsed command if it clears MIN_CONFIDENCE, else None (use the LLM)."""
+    parsed, confidence = parse_command(text, resolver)
+    if parsed is None or confidence < MIN_CONFIDENCE:
+        return None
+    return parsed
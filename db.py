@@ -1,15 +1,103 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME = "wishlistDB"
+DB_NAME = os.getenv("MONGO_DB_NAME", "wishlistDB")
+
+# Request handlers use the async (Motor) client so queries never block the event loop.
+# The sync client is only for background threads (store index watcher) and scripts.
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+}
+SYNC_POOL_OPTIONS = {**POOL_OPTIONS, "maxPoolSize": int(os.getenv("MONGO_SYNC_MAX_POOL_SIZE", "10")), "minPoolSize": 0}
+
+IN_MEMORY = MONGO_URI.startswith("mongomock://")
+
+if IN_MEMORY:
+    # In-memory stand-in for tests and benchmarks (pip install mongomock-motor)
+    import mongomock
+    from mongomock_motor import AsyncMongoMockClient
+
+    client = mongomock.MongoClient()
+    async_client = AsyncMongoMockClient(mock_mongo_client=client)
+else:
+    client = MongoClient(MONGO_URI, **SYNC_POOL_OPTIONS)
+    async_client = AsyncIOMotorClient(MONGO_URI, **POOL_OPTIONS)
 
-client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
+async_db = async_client[DB_NAME]
 
 # Collections
 user_collection = db["users"]
 store_collection = db["store"]
+history_collection = db["history"]
+
+async_user_collection = async_db["users"]
+async_store_collection = async_db["store"]
+async_history_collection = async_db["history"]
+
+
+def product_key(name: str) -> str:
+    """Normalized product name: what `store.product_key` is indexed on and what lookups compare."""
+    return " ".join(str(name).lower().split())
+
+
+MISSING_PRODUCT_KEY = {"product_key": {"$exists": False}}
+
+
+def product_key_backfill(docs) -> list:
+    """UpdateOne ops that set product_key on products inserted before it existed."""
+    return [UpdateOne({"_id": doc["_id"]}, {"$set": {"product_key": product_key(doc.get("product", ""))}})
+            for doc in docs]
+
+
+def backfill_product_keys(collection=None) -> int:
+    """
+    Sync backfill for scripts (seed_store.py, catalog_import.py): run it before
+    upserting on product_key, or old products get a second copy. Returns the count.
+    """
+    collection = store_collection if collection is None else collection
+    backfill = product_key_backfill(collection.find(MISSING_PRODUCT_KEY, {"_id": 1, "product": 1}))
+    if backfill:
+        collection.bulk_write(backfill, ordered=False)
+    return len(backfill)
+
+
+async def ensure_indexes():
+    """Create the indexes the hot paths rely on. Safe to run on every startup."""
+    try:
+        await async_user_collection.create_index([("username", ASCENDING)], unique=True, name="username_unique")
+    except PyMongoError as e:
+        print("Could not create unique username index (duplicate users?):", e)
+
+    # Backfill product_key on products inserted before it existed
+    missing = async_store_collection.find(MISSING_PRODUCT_KEY, {"_id": 1, "product": 1})
+    backfill = product_key_backfill([doc async for doc in missing])
+    if backfill:
+        await async_store_collection.bulk_write(backfill, ordered=False)
+
+    try:
+        await async_store_collection.create_index([("product_key", ASCENDING)], unique=True, name="product_key_unique")
+    except PyMongoError as e:
+        print("Could not create unique product_key index, falling back to non-unique:", e)
+        await async_store_collection.create_index([("product_key", ASCENDING)], name="product_key")
+
+    # Newest change first: the product resolver's catalog stamp (see product_resolver.py)
+    await async_store_collection.create_index([("updated_at", DESCENDING)], name="updated_at")
+
+    # history buckets are read newest-first per user (see history.py)
+    await async_history_collection.create_index(
+        [("username", ASCENDING), ("first", DESCENDING)], name="username_first"
+    )
+    await async_history_collection.create_index(
+        [("username", ASCENDING), ("last", DESCENDING)], name="username_last"
+    )
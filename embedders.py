@@ -0,0 +1,298 @@
+import argparse
+import os
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import numpy as np
+
+# embedders.py
+# Sentence embedding backends with SentenceTransformer's `encode(texts)` interface:
+#   torch - sentence-transformers on PyTorch, fp32 (the original model)
+#   onnx  - the same MiniLM exported to ONNX and int8-quantized, run with ONNX Runtime;
+#           needs only onnxruntime + tokenizers, so torch can be left out of the image
+#   hash  - stand-in for tests and benchmarks, no model
+# EMBEDDING_BACKEND selects one. Export the ONNX model once with:
+#
+#   python embedders.py --export-onnx models/all-MiniLM-L6-v2-onnx-int8
+#
+# (the export itself needs torch + transformers; serving doesn't). Check it against
+# the torch model with embedding_parity.py before switching.
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("EMBEDDING_ONNX_DIR", f"models/{EMBEDDING_MODEL}-onnx-int8")
+ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 = ONNX Runtime default
+BATCHING = os.getenv("EMBEDDING_BATCHING", "1") == "1"
+BATCH_MAX_TEXTS = int(os.getenv("EMBEDDING_BATCH_MAX", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+# A batched encode() call fails if the batching thread finishes no forward pass for this long
+BATCH_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_BATCH_TIMEOUT_SECONDS", "300"))
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length
+
+
+class TorchEmbedder:
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        # Keeps existing embedding cache entries and index files valid
+        self.name = model_name
+
+    def encode(self, texts: list, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), convert_to_numpy=True, **kwargs), dtype="float32")
+
+
+class OnnxEmbedder:
+    """
+    MiniLM forward pass in ONNX Runtime plus the same mean pooling and L2
+    normalization sentence-transformers applies, so vectors are interchangeable
+    within the parity tolerance.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, model_file: str = "model_int8.onnx",
+                 batch_size: int = 64, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.batch_size = batch_size
+        self.name = f"{EMBEDDING_MODEL}-onnx-int8" if "int8" in model_file else f"{EMBEDDING_MODEL}-onnx"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: list, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        texts = list(texts)
+        chunks = [self._encode_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        if not chunks:
+            return np.empty((0, 0), dtype="float32")
+        return np.vstack(chunks)
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalize (all-MiniLM-L6-v2's Pooling + Normalize modules)
+        mask = attention_mask[..., None].astype("float32")
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype("float32")
+
+
+class HashEmbedder:
+    """
+    Stand-in for tests and benchmarks (EMBEDDING_BACKEND=hash): words hashed into
+    `dim` buckets, L2-normalized. No model download, microseconds per text.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def encode(self, texts: list, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in str(text).lower().split():
+                vectors[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+
+# ===================== MICRO-BATCHING =======================
+class BatchingEmbedder:
+    """
+    Coalesces concurrent encode() calls: requests arriving within `max_wait_ms`
+    of each other (up to `max_batch` texts) share one forward pass on a dedicated
+    thread, and each caller gets its own rows back. Bigger calls (index builds)
+    go through in `max_batch` chunks, one at a time, so small requests queued
+    meanwhile run between chunks. Drop-in for the wrapped embedder.
+    """
+
+    def __init__(self, embedder, max_batch: int = 64, max_wait_ms: float = 5, timeout: float = BATCH_TIMEOUT_SECONDS):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self.batches = 0
+        self.texts = 0
+        self._closed = False
+        self._passes = 0  # forward passes finished, failed ones included
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def encode(self, texts: list, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return self.embedder.encode(texts)
+        if len(texts) <= self.max_batch:
+            return self._wait(self._submit(texts))
+        # One chunk queued at a time: requests that arrive meanwhile run before the next one
+        return np.concatenate([self._wait(self._submit(texts[i:i + self.max_batch]))
+                               for i in range(0, len(texts), self.max_batch)])
+
+    def close(self):
+        """Stop the batching thread; requests still queued fail instead of waiting."""
+        self._closed = True
+        self._queue.put(None)
+
+    def _submit(self, texts: list) -> Future:
+        if self._closed:
+            raise RuntimeError("Embedding batcher is closed")
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def _wait(self, future: Future):
+        """
+        Result of a queued request. Waiting is only bounded while the batching
+        thread makes no progress, so a caller can't hang on a thread that has
+        stopped, but a long queue of work still finishes.
+        """
+        while True:
+            passes = self._passes
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                if self._passes == passes:
+                    raise
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "texts": self.texts,
+                "mean_batch_size": self.texts / self.batches if self.batches else 0.0}
+
+    def _run(self):
+        try:
+            self._batch_forever()
+        except Exception as e:
+            print("Embedding batcher stopped:", e)
+        finally:
+            self._closed = True
+            self._fail_pending()
+
+    def _fail_pending(self):
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                request[1].set_exception(RuntimeError("Embedding batcher is closed"))
+
+    def _batch_forever(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            requests = [request]
+            size = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            # Big requests (index builds) already fill a batch; don't hold them back
+            while size < self.max_batch:
+                try:
+                    # Whatever queued up during the last forward pass joins without waiting
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                requests.append(request)
+                size += len(request[0])
+            self._encode(requests)
+
+    def _encode(self, requests: list):
+        # Identical texts from different callers are encoded once
+        unique = list(dict.fromkeys(text for texts, _ in requests for text in texts))
+        try:
+            vectors = np.asarray(self.embedder.encode(unique), dtype="float32")
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+        finally:
+            self._passes += 1
+        self.batches += 1
+        self.texts += len(unique)
+        row = {text: i for i, text in enumerate(unique)}
+        for texts, future in requests:
+            future.set_result(vectors[[row[text] for text in texts]])
+
+
+def create_embedder(backend: str = EMBEDDING_BACKEND, batching: bool = BATCHING):
+    if backend == "onnx":
+        embedder = OnnxEmbedder()
+    elif backend == "torch":
+        embedder = TorchEmbedder()
+    elif backend == "hash":
+        embedder = HashEmbedder()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}, expected 'torch', 'onnx' or 'hash'")
+    if batching:
+        embedder = BatchingEmbedder(embedder, max_batch=BATCH_MAX_TEXTS, max_wait_ms=BATCH_MAX_WAIT_MS,
+                                    timeout=BATCH_TIMEOUT_SECONDS)
+    return embedder
+
+
+# ===================== EXPORT =======================
+def export_onnx(out_dir: str, model_name: str = EMBEDDING_MODEL):
+    """Export the Hugging Face checkpoint to ONNX and write an int8 dynamically quantized copy."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(out_dir, exist_ok=True)
+    repo = f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    model = AutoModel.from_pretrained(repo).eval()
+
+    sample = tokenizer(["add two apples to my list"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+    quantize_dynamic(fp32_path, os.path.join(out_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)  # tokenizer.json is all OnnxEmbedder needs
+    print(f"✅ Exported {model_name} to {out_dir} (model.onnx, model_int8.onnx, tokenizer.json)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backends")
+    parser.add_argument("--export-onnx", metavar="DIR", help="export the int8 ONNX model to DIR")
+    args = parser.parse_args()
+    if args.export_onnx:
+        export_onnx(args.export_onnx)
+    else:
+        parser.print_help()
@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# embedding_cache.py
+# Text -> embedding cache shared by the store index build and the recommendation path.
+# In-memory LRU in front of a SQLite file, keyed by model name + normalized text,
+# so a restart (or another worker on the same disk) reuses vectors instead of
+# running the model again.
+
+
+def normalize_text(text: str) -> str:
+    """MiniLM's tokenizer is uncased, so case and extra whitespace don't change the vector."""
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingCache:
+    def __init__(self, model, model_name: str, path: str = None, max_memory_items: int = 50000):
+        """
+        model: anything with SentenceTransformer's `encode(texts, convert_to_numpy=True)`.
+        path: SQLite file for the persistent tier; None/"" keeps the cache in memory only.
+        """
+        self.model = model
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Return a float32 matrix with one row per text, running the model only for unseen texts."""
+        keys = [normalize_text(t) for t in texts]
+        found = {}
+
+        with self._lock:
+            for key in set(keys):
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing and self._db is not None:
+            found_on_disk = self._load(missing)
+            found.update(found_on_disk)
+            self._remember(found_on_disk)
+            missing = [k for k in missing if k not in found_on_disk]
+
+        if missing:
+            vectors = np.asarray(self.model.encode(missing, convert_to_numpy=True), dtype="float32")
+            computed = dict(zip(missing, vectors))
+            found.update(computed)
+            self._remember(computed)
+            self._store(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+        if not keys:
+            return np.empty((0, 0), dtype="float32")
+        return np.vstack([found[k] for k in keys])
+
+    # ===================== STORAGE =======================
+    def _remember(self, vectors: dict):
+        with self._lock:
+            for key, vec in vectors.items():
+                self._memory[key] = vec
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _load(self, keys: list) -> dict:
+        result = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT text, vector FROM embeddings WHERE model = ? AND text IN ({placeholders})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                for text, blob in rows:
+                    result[text] = np.frombuffer(blob, dtype="float32")
+        return result
+
+    def _store(self, vectors: dict):
+        if self._db is None or not vectors:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                [(self.model_name, key, vec.tobytes()) for key, vec in vectors.items()],
+            )
+            self._db.commit()
@@ -0,0 +1,82 @@
+import argparse
+import sys
+import time
+import numpy as np
+from embedders import OnnxEmbedder, TorchEmbedder, ONNX_MODEL_DIR
+
+# embedding_parity.py
+# Checks the ONNX int8 embedder against the torch one before switching
+# EMBEDDING_BACKEND: per-text cosine similarity, agreement of the k nearest
+# catalog neighbours (what recommendations depend on), and encode throughput.
+# Exits 1 if the ONNX model is outside the tolerances.
+#
+#   python embedding_parity.py                   # store catalog names from MongoDB
+#   python embedding_parity.py --texts names.txt # one text per line
+
+
+def load_texts(path: str = None) -> list:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    from db import store_collection
+    return [doc["product"] for doc in store_collection.find({}, {"product": 1}) if doc.get("product")]
+
+
+def timed_encode(embedder, texts: list):
+    embedder.encode(texts[:8])  # warm-up
+    started = time.perf_counter()
+    vectors = embedder.encode(texts)
+    return vectors, len(texts) / (time.perf_counter() - started)
+
+
+def neighbour_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Mean fraction of each text's k nearest neighbours (excluding itself) both backends agree on."""
+    k = min(k, len(reference) - 1)
+    if k < 1:
+        return 1.0
+    overlaps = []
+    for start in range(0, len(reference), 1024):
+        ref_sim = reference[start:start + 1024] @ reference.T
+        cand_sim = candidate[start:start + 1024] @ candidate.T
+        for row, (ref_row, cand_row) in enumerate(zip(ref_sim, cand_sim)):
+            ref_row[start + row] = cand_row[start + row] = -np.inf
+            ref_top = set(np.argpartition(-ref_row, k)[:k])
+            cand_top = set(np.argpartition(-cand_row, k)[:k])
+            overlaps.append(len(ref_top & cand_top) / k)
+    return float(np.mean(overlaps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX int8 embeddings with the torch model")
+    parser.add_argument("--texts", help="file with one text per line (default: store catalog)")
+    parser.add_argument("--onnx-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.95, help="lowest allowed per-text cosine")
+    parser.add_argument("--min-overlap", type=float, default=0.90, help="lowest allowed mean top-k overlap")
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts)
+    if len(texts) < 2:
+        sys.exit("Need at least 2 texts")
+
+    torch_vectors, torch_rate = timed_encode(TorchEmbedder(), texts)
+    onnx_vectors, onnx_rate = timed_encode(OnnxEmbedder(args.onnx_dir), texts)
+
+    # Both backends return L2-normalized vectors, so the row-wise dot product is the cosine
+    cosines = np.sum(torch_vectors * onnx_vectors, axis=1)
+    overlap = neighbour_overlap(torch_vectors, onnx_vectors, args.k)
+
+    print(f"{len(texts)} texts")
+    print(f"cosine(torch, onnx): min {cosines.min():.4f}, mean {cosines.mean():.4f}")
+    print(f"top-{args.k} neighbour overlap: {overlap:.3f}")
+    print(f"throughput: torch {torch_rate:.0f} texts/s, onnx {onnx_rate:.0f} texts/s "
+          f"({onnx_rate / torch_rate:.1f}x)")
+
+    if cosines.min() < args.min_cosine or overlap < args.min_overlap:
+        print("❌ ONNX embeddings are outside the tolerance")
+        sys.exit(1)
+    print("✅ ONNX embeddings match the torch model within tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,49 @@ class APIClient {
     constructor(baseURL = 'http://127.0.0.1:5000') {
         this.baseURL = baseURL;
         this.timeout = 30000; // 30 seconds
+        // endpoint -> { etag, body } for conditional GETs
+        this.etagCache = new Map();
+    }
+
+    // GET that revalidates with If-None-Match; a 304 reuses the last body
+    async getCached(endpoint) {
+        const cached = this.etagCache.get(endpoint);
+        const controller = new AbortController();
+        const timeoutId = setTimeout(() => controller.abort(), this.timeout);
+
+        try {
+            const response = await fetch(`${this.baseURL}${endpoint}`, {
+                headers: cached ? { 'If-None-Match': cached.etag } : {},
+                // We handle revalidation ourselves; keep the browser cache out of it
+                cache: 'no-store',
+                signal: controller.signal
+            });
+            clearTimeout(timeoutId);
+
+            if (response.status === 304 && cached) {
+                return cached.body;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const body = await response.json();
+            const etag = response.headers.get('ETag');
+            if (etag) {
+                this.etagCache.set(endpoint, { etag, body });
+            } else {
+                this.etagCache.delete(endpoint);
+            }
+            return body;
+        } catch (error) {
+            clearTimeout(timeoutId);
+
+            if (error.name === 'AbortError') {
+                throw new Error('Request timeout');
+            }
+
+            throw error;
+        }
     }
 
     async request(endpoint, options = {}) {
@@ -73,8 +116,95 @@ class APIClient {
         }
     }
 
+    // Open a streaming recognition session on /ws/recognise.
+    // Returns { opened, send(chunk), finish(), abort() }; finish() resolves with
+    // the same fields as uploadAudio().
+    openRecognitionStream({ onPartial = null, sampleRate = 16000 } = {}) {
+        const socket = new WebSocket(`${this.baseURL.replace(/^http/, 'ws')}/ws/recognise`);
+        socket.binaryType = 'arraybuffer';
+
+        let resolveResult;
+        let rejectResult;
+        const result = new Promise((resolve, reject) => {
+            resolveResult = resolve;
+            rejectResult = reject;
+        });
+        result.catch(() => {}); // surfaced through finish()
+
+        const opened = new Promise((resolve, reject) => {
+            socket.onopen = () => {
+                socket.send(JSON.stringify({
+                    type: 'start',
+                    encoding: 'pcm_s16le',
+                    sample_rate: sampleRate
+                }));
+                resolve();
+            };
+            socket.onerror = () => {
+                const error = new Error('Streaming connection failed');
+                reject(error);
+                rejectResult(error);
+            };
+        });
+
+        socket.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+
+            if (message.type === 'partial') {
+                if (onPartial) onPartial(message);
+            } else if (message.type === 'result') {
+                resolveResult(message);
+            } else if (message.type === 'error') {
+                rejectResult(new Error(message.error));
+            }
+        };
+
+        // No-op if a result or error already settled the promise
+        socket.onclose = () => rejectResult(new Error('Streaming connection closed'));
+
+        return {
+            opened,
+            send: (chunk) => {
+                if (socket.readyState === WebSocket.OPEN) {
+                    socket.send(chunk);
+                }
+            },
+            finish: async () => {
+                socket.send(JSON.stringify({ type: 'stop' }));
+
+                const timeout = new Promise((_, reject) => {
+                    setTimeout(() => reject(new Error('Recognition timeout')), this.timeout);
+                });
+
+                try {
+                    return await Promise.race([result, timeout]);
+                } finally {
+                    socket.close();
+                }
+            },
+            abort: () => socket.close()
+        };
+    }
+
+    // Server-sent wishlist/recommendation updates from /events/{username}.
+    // handlers: { wishlist, recommendations, resync, open, error }; returns the
+    // EventSource (it reconnects by itself; call close() to stop).
+    subscribeEvents(username, handlers = {}) {
+        const source = new EventSource(`${this.baseURL}/events/${username}`);
+
+        for (const type of ['wishlist', 'recommendations', 'resync']) {
+            source.addEventListener(type, (event) => {
+                if (handlers[type]) handlers[type](JSON.parse(event.data));
+            });
+        }
+        source.onopen = () => handlers.open && handlers.open();
+        source.onerror = () => handlers.error && handlers.error(source.readyState);
+
+        return source;
+    }
+
     async getWishlist(username) {
-        return this.request(`/wishlist/${username}`);
+        return this.getCached(`/wishlist/${username}`);
     }
 
     async updateWishlist(username, action) {
@@ -84,8 +214,16 @@ class APIClient {
         });
     }
 
+    // Several confirmed commands in one request; one result per command, in order
+    async updateWishlistBatch(username, commands) {
+        return this.request(`/update_wishlist/${username}/batch`, {
+            method: 'POST',
+            body: JSON.stringify({ commands })
+        });
+    }
+
     async getRecommendations(username) {
-        return this.request(`/recommendations/${username}`);
+        return this.getCached(`/recommendations/${username}`);
     }
 }
 
@@ -6,10 +6,22 @@ class VoiceShoppingApp {
     this.audioRecorder = null;
     this.isRecording = false;
     this.pendingAction = null;
+    this.recognitionStream = null;
+    // Confirmed commands that couldn't be sent while offline, replayed as one batch
+    this.offlineQueueKey = "pendingWishlistCommands";
+    // Server-pushed updates (/events): product -> wishlist line, and the rev they're at
+    this.events = null;
+    this.liveUpdates = false;
+    this.wishlistLines = new Map();
+    this.wishlistRev = null;
 
     // Initialize components
     this.ui = new UIManager();
     this.audioRecorder = new AudioRecorder();
+    this.api = new APIClient(this.baseURL);
+
+    // Stream audio over WebSocket when possible; POST the whole clip otherwise
+    this.useStreaming = AudioUtils.isStreamingSupported();
 
     // Bind methods
     this.handleVoiceCommand = this.handleVoiceCommand.bind(this);
@@ -24,9 +36,13 @@ class VoiceShoppingApp {
       // Initialize UI components
       this.setupEventListeners();
 
-      // Load initial data
-      await this.loadWishlist();
-      await this.loadRecommendations();
+      // Load initial data (after replaying anything queued while offline)
+      await this.flushOfflineQueue();
+      // The event stream starts with the full wishlist and recommendations
+      if (!this.startLiveUpdates()) {
+        await this.loadWishlist();
+        await this.loadRecommendations();
+      }
 
       // Initialize audio (check browser support)
       if (!this.audioRecorder.isSupported) {
@@ -92,6 +108,10 @@ class VoiceShoppingApp {
       this.isRecording = true;
       this.ui.updateRecordingState(true);
 
+      if (this.useStreaming && (await this.startStreaming())) {
+        return;
+      }
+
       await this.audioRecorder.startRecording();
     } catch (error) {
       console.error("Recording start error:", error);
@@ -104,12 +124,40 @@ class VoiceShoppingApp {
     }
   }
 
+  // Returns false (and disables streaming) if the stream can't be set up
+  async startStreaming() {
+    const stream = this.api.openRecognitionStream({
+      onPartial: (message) => this.ui.showTranscription(message.text),
+    });
+
+    try {
+      await stream.opened;
+      await this.audioRecorder.startStreaming((chunk) => stream.send(chunk));
+      this.recognitionStream = stream;
+      return true;
+    } catch (error) {
+      console.warn("Streaming unavailable, falling back to upload:", error);
+      stream.abort();
+      this.audioRecorder.stopStreaming();
+      this.useStreaming = false;
+      return false;
+    }
+  }
+
   async stopRecording() {
     try {
       this.isRecording = false;
       this.ui.updateRecordingState(false);
       this.ui.showProcessingState("Processing voice command...");
 
+      if (this.recognitionStream) {
+        const stream = this.recognitionStream;
+        this.recognitionStream = null;
+        this.audioRecorder.stopStreaming();
+        this.handleRecognitionResult(await stream.finish());
+        return;
+      }
+
       const audioBlob = await this.audioRecorder.stopRecording();
       await this.handleVoiceCommand(audioBlob);
     } catch (error) {
@@ -138,20 +186,7 @@ class VoiceShoppingApp {
       }
 
       const result = await response.json();
-
-      if (result.error) {
-        throw new Error(result.error);
-      }
-
-      // Display transcription
-      this.ui.displayTranscription(
-        result.recognized_text,
-        result.normalized_text
-      );
-
-      // Show confirmation dialog
-      this.pendingAction = result.llm_response;
-      this.ui.showConfirmationDialog(result.llm_response);
+      this.handleRecognitionResult(result);
     } catch (error) {
       console.error("Voice command error:", error);
       this.ui.showNotification(
@@ -161,9 +196,30 @@ class VoiceShoppingApp {
     }
   }
 
+  handleRecognitionResult(result) {
+    if (result.error) {
+      throw new Error(result.error);
+    }
+
+    // Display transcription
+    this.ui.displayTranscription(
+      result.recognized_text,
+      result.normalized_text
+    );
+
+    // Show confirmation dialog (every item when one command named several)
+    this.pendingAction =
+      result.items && result.items.length > 1 ? result.items : result.llm_response;
+    this.ui.showConfirmationDialog(this.pendingAction);
+  }
+
   async confirmAction() {
     if (!this.pendingAction) return;
 
+    if (Array.isArray(this.pendingAction)) {
+      return this.confirmBatch(this.pendingAction);
+    }
+
     try {
       this.ui.showProcessingState("Updating wishlist...");
 
@@ -191,21 +247,160 @@ class VoiceShoppingApp {
       this.ui.showNotification(result.message, "success");
       this.ui.hideConfirmationDialog();
 
-      // Refresh data
-      await this.loadWishlist();
-      await this.loadRecommendations();
+      await this.refreshAfterChange();
     } catch (error) {
       console.error("Confirm action error:", error);
-      this.ui.showNotification(
-        "Failed to update wishlist: " + error.message,
-        "error"
-      );
+      if (this.isNetworkError(error)) {
+        this.queueOffline([this.pendingAction]);
+        this.ui.hideConfirmationDialog();
+      } else {
+        this.ui.showNotification(
+          "Failed to update wishlist: " + error.message,
+          "error"
+        );
+      }
     } finally {
       this.pendingAction = null;
       this.ui.hideProcessingState();
     }
   }
 
+  async confirmBatch(commands) {
+    try {
+      this.ui.showProcessingState("Updating wishlist...");
+
+      const result = await this.api.updateWishlistBatch(this.username, commands);
+      if (result.error) {
+        throw new Error(result.error);
+      }
+
+      this.showBatchResult(result);
+      this.ui.hideConfirmationDialog();
+
+      await this.refreshAfterChange();
+    } catch (error) {
+      console.error("Confirm batch error:", error);
+      if (this.isNetworkError(error)) {
+        this.queueOffline(commands);
+        this.ui.hideConfirmationDialog();
+      } else {
+        this.ui.showNotification(
+          "Failed to update wishlist: " + error.message,
+          "error"
+        );
+      }
+    } finally {
+      this.pendingAction = null;
+      this.ui.hideProcessingState();
+    }
+  }
+
+  showBatchResult(result) {
+    const errors = result.results
+      .filter((item) => item.error)
+      .map((item) => item.error);
+    this.ui.showNotification(
+      errors.length ? `${result.message}: ${errors.join("; ")}` : result.message,
+      errors.length ? "warning" : "success"
+    );
+  }
+
+  // ===================== LIVE UPDATES =====================
+  // After a change the server pushes the wishlist diff and new recommendations,
+  // so there is no GET /wishlist + GET /recommendations round trip. Falls back to
+  // those GETs when EventSource is missing or the stream is down.
+  startLiveUpdates() {
+    if (typeof EventSource === "undefined") return false;
+
+    this.events = this.api.subscribeEvents(this.username, {
+      open: () => {
+        this.liveUpdates = true;
+      },
+      error: (readyState) => {
+        // CONNECTING: the browser retries by itself and gets a fresh snapshot
+        this.liveUpdates = false;
+        if (readyState === EventSource.CLOSED) this.events = null;
+      },
+      wishlist: (event) => this.applyWishlistEvent(event),
+      recommendations: (event) => {
+        // A slow push for an older wishlist must not overwrite a newer one
+        if (this.wishlistRev !== null && event.rev < this.wishlistRev) return;
+        this.ui.displayRecommendations(event.recommendations || []);
+      },
+      resync: () => this.restartLiveUpdates(),
+    });
+    return true;
+  }
+
+  applyWishlistEvent(event) {
+    if (event.snapshot) {
+      this.wishlistLines = new Map(event.items.map((line) => [line.product, line]));
+    } else if (event.base_rev !== this.wishlistRev) {
+      // Missed an update: the diff doesn't apply to what we show
+      this.restartLiveUpdates();
+      return;
+    } else {
+      event.removed.forEach((product) => this.wishlistLines.delete(product));
+      event.upserted.forEach((line) => this.wishlistLines.set(line.product, line));
+    }
+    this.wishlistRev = event.rev;
+    this.ui.displayWishlist(Array.from(this.wishlistLines.values()));
+  }
+
+  // A new connection starts with a fresh snapshot
+  restartLiveUpdates() {
+    if (this.events) this.events.close();
+    this.liveUpdates = false;
+    this.wishlistRev = null;
+    this.startLiveUpdates();
+  }
+
+  // After a write: the event stream delivers the result; poll only without it
+  async refreshAfterChange() {
+    if (this.liveUpdates) return;
+    await this.loadWishlist();
+    await this.loadRecommendations();
+  }
+
+  // ===================== OFFLINE QUEUE =====================
+  isNetworkError(error) {
+    // fetch rejects with a TypeError when the request never reached the server
+    return !navigator.onLine || error instanceof TypeError;
+  }
+
+  queueOffline(commands) {
+    const queued = JSON.parse(localStorage.getItem(this.offlineQueueKey) || "[]");
+    localStorage.setItem(
+      this.offlineQueueKey,
+      JSON.stringify(queued.concat(commands))
+    );
+    this.ui.showNotification(
+      "You're offline, the change will be applied when the connection is back",
+      "warning"
+    );
+  }
+
+  async flushOfflineQueue() {
+    const queued = JSON.parse(localStorage.getItem(this.offlineQueueKey) || "[]");
+    if (!queued.length || !navigator.onLine) return;
+
+    try {
+      const result = await this.api.updateWishlistBatch(this.username, queued);
+      if (result.error) {
+        throw new Error(result.error);
+      }
+      // Keep anything queued while this batch was in flight
+      const remaining = JSON.parse(
+        localStorage.getItem(this.offlineQueueKey) || "[]"
+      ).slice(queued.length);
+      localStorage.setItem(this.offlineQueueKey, JSON.stringify(remaining));
+      this.showBatchResult(result);
+    } catch (error) {
+      // Still unreachable: keep the queue for the next "online" event
+      console.error("Offline queue replay error:", error);
+    }
+  }
+
   cancelAction() {
     this.pendingAction = null;
     this.ui.hideConfirmationDialog();
@@ -216,13 +411,8 @@ class VoiceShoppingApp {
     try {
       this.ui.showWishlistLoading(true);
 
-      const response = await fetch(`${this.baseURL}/wishlist/${this.username}`);
-
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-
-      const result = await response.json();
+      // Conditional GET: unchanged wishlists come back as 304 with no body
+      const result = await this.api.getWishlist(this.username);
       this.ui.displayWishlist(result.wishlist || []);
     } catch (error) {
       console.error("Load wishlist error:", error);
@@ -237,15 +427,7 @@ class VoiceShoppingApp {
     try {
       this.ui.showRecommendationsLoading(true);
 
-      const response = await fetch(
-        `${this.baseURL}/recommendations/${this.username}`
-      );
-
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-
-      const result = await response.json();
+      const result = await this.api.getRecommendations(this.username);
       this.ui.displayRecommendations(result.recommendations || []);
     } catch (error) {
       console.error("Load recommendations error:", error);
@@ -260,11 +442,12 @@ class VoiceShoppingApp {
     try {
       this.ui.showProcessingState("Removing item...");
 
+      // "delete" drops the whole line; "remove" would only take `quantity` units off
       const removeAction = {
         product: product,
         quantity: 1,
         category: "unknown",
-        action: "remove",
+        action: "delete",
         status: "manual_removal",
       };
 
@@ -291,9 +474,7 @@ class VoiceShoppingApp {
 
       this.ui.showNotification(result.message, "success");
 
-      // Refresh data
-      await this.loadWishlist();
-      await this.loadRecommendations();
+      await this.refreshAfterChange();
     } catch (error) {
       console.error("Remove item error:", error);
       this.ui.showNotification(
@@ -340,9 +521,7 @@ class VoiceShoppingApp {
 
       this.ui.showNotification(result.message, "success");
 
-      // Refresh data
-      await this.loadWishlist();
-      await this.loadRecommendations();
+      await this.refreshAfterChange();
     } catch (error) {
       console.error("Add recommended item error:", error);
       this.ui.showNotification("Failed to add item: " + error.message, "error");
@@ -386,9 +565,7 @@ class VoiceShoppingApp {
 
       this.ui.showNotification(result.message, "success");
 
-      // Refresh data
-      await this.loadWishlist();
-      await this.loadRecommendations();
+      await this.refreshAfterChange();
     } catch (error) {
       console.error("Add recommended item error:", error);
       this.ui.showNotification("Failed to add item: " + error.message, "error");
@@ -425,12 +602,14 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   // Handle offline/online status
-  window.addEventListener("online", () => {
+  window.addEventListener("online", async () => {
     document.querySelector(".app-container").classList.remove("offline");
     window.voiceShoppingApp.ui.showNotification(
       "Connection restored",
       "success"
     );
+    await window.voiceShoppingApp.flushOfflineQueue();
+    await window.voiceShoppingApp.refreshAfterChange();
   });
 
   window.addEventListener("offline", () => {
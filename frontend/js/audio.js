@@ -9,6 +9,11 @@ class AudioRecorder {
         this.recordingStartTime = null;
         this.maxRecordingTime = 60000; // 60 seconds max
         this.minRecordingTime = 1000; // 1 second min
+
+        // PCM streaming (WebSocket recognition)
+        this.audioContext = null;
+        this.processor = null;
+        this.streamSampleRate = 16000;
     }
 
     // Check browser support for audio recording
@@ -187,6 +192,80 @@ class AudioRecorder {
         });
     }
 
+    // Start streaming 16-bit PCM chunks (16 kHz mono) to onChunk while the user speaks
+    async startStreaming(onChunk) {
+        if (!AudioUtils.isStreamingSupported()) {
+            throw new Error('Audio streaming is not supported in this browser');
+        }
+
+        if (this.isRecording) {
+            throw new Error('Recording is already in progress');
+        }
+
+        try {
+            this.audioStream = await navigator.mediaDevices.getUserMedia({
+                audio: {
+                    echoCancellation: true,
+                    noiseSuppression: true,
+                    autoGainControl: true
+                }
+            });
+
+            const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+            this.audioContext = new AudioContextClass();
+            const inputSampleRate = this.audioContext.sampleRate;
+            const source = this.audioContext.createMediaStreamSource(this.audioStream);
+
+            // ~85ms of audio per callback at 48 kHz
+            this.processor = this.audioContext.createScriptProcessor(4096, 1, 1);
+            this.processor.onaudioprocess = (event) => {
+                const samples = AudioUtils.downsample(
+                    event.inputBuffer.getChannelData(0),
+                    inputSampleRate,
+                    this.streamSampleRate
+                );
+                onChunk(AudioUtils.floatTo16BitPCM(samples));
+            };
+
+            source.connect(this.processor);
+            this.processor.connect(this.audioContext.destination);
+
+            this.isRecording = true;
+            this.recordingStartTime = Date.now();
+
+            // Auto-stop after max recording time
+            setTimeout(() => {
+                if (this.isRecording && this.processor) {
+                    console.warn('Auto-stopping stream after maximum time');
+                    this.stopStreaming();
+                }
+            }, this.maxRecordingTime);
+
+            return true;
+        } catch (error) {
+            this.stopStreaming();
+            throw error;
+        }
+    }
+
+    // Stop streaming and release the microphone
+    stopStreaming() {
+        if (this.processor) {
+            this.processor.onaudioprocess = null;
+            this.processor.disconnect();
+            this.processor = null;
+        }
+
+        if (this.audioContext) {
+            this.audioContext.close();
+            this.audioContext = null;
+        }
+
+        this.stopAudioStream();
+        this.isRecording = false;
+        this.recordingStartTime = null;
+    }
+
     // Create audio blob from recorded chunks
     createAudioBlob() {
         if (this.audioChunks.length === 0) {
@@ -222,6 +301,7 @@ class AudioRecorder {
 
     // Clean up resources
     cleanup() {
+        this.stopStreaming();
         this.isRecording = false;
         this.stopAudioStream();
         this.audioChunks = [];
@@ -306,6 +386,51 @@ const AudioUtils = {
         );
     },
 
+    // Check if browser can capture raw PCM for streaming recognition
+    isStreamingSupported() {
+        return !!(
+            navigator.mediaDevices &&
+            navigator.mediaDevices.getUserMedia &&
+            window.WebSocket &&
+            (window.AudioContext || window.webkitAudioContext)
+        );
+    },
+
+    // Average-downsample Float32 samples from inputRate to outputRate
+    downsample(samples, inputRate, outputRate) {
+        if (outputRate >= inputRate) {
+            return samples;
+        }
+
+        const ratio = inputRate / outputRate;
+        const result = new Float32Array(Math.floor(samples.length / ratio));
+
+        for (let i = 0; i < result.length; i++) {
+            const start = Math.floor(i * ratio);
+            const end = Math.min(Math.floor((i + 1) * ratio), samples.length);
+            let sum = 0;
+            for (let j = start; j < end; j++) {
+                sum += samples[j];
+            }
+            result[i] = sum / Math.max(end - start, 1);
+        }
+
+        return result;
+    },
+
+    // Convert Float32 samples [-1, 1] to little-endian 16-bit PCM
+    floatTo16BitPCM(samples) {
+        const buffer = new ArrayBuffer(samples.length * 2);
+        const view = new DataView(buffer);
+
+        for (let i = 0; i < samples.length; i++) {
+            const sample = Math.max(-1, Math.min(1, samples[i]));
+            view.setInt16(i * 2, sample < 0 ? sample * 0x8000 : sample * 0x7fff, true);
+        }
+
+        return buffer;
+    },
+
     // Get user-friendly browser compatibility message
     getBrowserCompatibilityMessage() {
         if (!navigator.mediaDevices) {
@@ -121,6 +121,26 @@ class UIManager {
 
     // Confirmation Dialog
     showConfirmationDialog(llmResponse) {
+        // Multi-item command: one summary row per item
+        if (Array.isArray(llmResponse)) {
+            const rows = llmResponse.map(({ product, quantity, category, action }) => `
+                <div class="action-summary">
+                    <span class="action-badge ${action}">${action.toUpperCase()}</span>
+                    <span class="product-name">${product}</span>
+                    ${quantity > 1 ? `<span class="quantity">×${quantity}</span>` : ''}
+                    <span class="category-tag">${category}</span>
+                </div>
+            `).join('');
+            this.elements.confirmationText.innerHTML = `
+                <div class="confirmation-details">
+                    <p>Apply these ${llmResponse.length} changes to your shopping list?</p>
+                    ${rows}
+                </div>
+            `;
+            this.elements.confirmationDialog.classList.add('active');
+            return;
+        }
+
         const { product, quantity, category, action } = llmResponse;
         const message = `${action.toUpperCase()} ${quantity > 1 ? quantity + ' ' : ''}${product} ${action === 'add' ? 'to' : 'from'} your shopping list?`;
         
@@ -1,8 +1,13 @@
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from rapidfuzz import fuzz, process
-from db import user_collection, store_collection
+from db import async_user_collection, async_store_collection, product_key
+import asyncio
 import datetime
-from difflib import get_close_matches
+import os
 import re
+from product_resolver import store_resolver
+from history import record_event, record_events
 # helper_functions.py
 
 def validate_llm_response(llm_response: dict) -> bool:
@@ -35,18 +40,137 @@ def validate_llm_response(llm_response: dict) -> bool:
     return True
 
 
-def find_closest_product(query: str, items: list, key: str = "product"):
-    """Find the closest matching product by fuzzy string match."""
-    product_names = [item[key] for item in items if key in item]
-    matches = get_close_matches(query.lower(), [p.lower() for p in product_names], n=1, cutoff=0.6)
-    if matches:
-        for item in items:
-            if item[key].lower() == matches[0]:
-                return item
-    return None
+# ======================= STOCK =======================
+async def reserve_stock(product_id, quantity: int) -> bool:
+    """Atomically take `quantity` units from the store; False if not enough stock."""
+    reserved = await async_store_collection.find_one_and_update(
+        {"_id": product_id, "quantity": {"$gte": quantity}},
+        {"$inc": {"quantity": -quantity}, "$currentDate": {"updated_at": True}},
+        projection={"_id": 1},
+    )
+    return reserved is not None
 
 
-def update_wishlist(username: str, llm_response: dict): 
+async def release_stock(product_name: str, quantity: int):
+    if quantity > 0:
+        await async_store_collection.update_one(
+            {"product_key": product_key(product_name)},
+            {"$inc": {"quantity": quantity}, "$currentDate": {"updated_at": True}},
+        )
+
+
+async def release_stock_many(quantities: dict):
+    """release_stock for {product name: quantity} in one bulk_write."""
+    totals = {}
+    for name, quantity in quantities.items():
+        if quantity > 0:
+            totals[product_key(name)] = totals.get(product_key(name), 0) + quantity
+    if totals:
+        await async_store_collection.bulk_write([
+            UpdateOne({"product_key": key}, {"$inc": {"quantity": quantity}, "$currentDate": {"updated_at": True}})
+            for key, quantity in totals.items()
+        ], ordered=False)
+
+
+# ======================= WISHLIST LINES =======================
+# Every write bumps `wishlist_rev` so cached recommendations can tell they are stale
+WISHLIST_LINE_FIELDS = ("product", "quantity", "reserved", "category", "action", "status", "timestamp")
+
+
+async def merge_wishlist_line(username: str, entry: dict):
+    """
+    One line per product: bump the quantity of an existing line, otherwise push a new one.
+    The $ne guard plus the unique username index make the push safe against a
+    concurrent add of the same product.
+    """
+    line_update = {
+        "$inc": {
+            "wishlist.$.quantity": entry["quantity"],
+            "wishlist.$.reserved": entry["reserved"],
+            "wishlist_rev": 1,
+        },
+        "$set": {"wishlist.$.status": entry["status"], "wishlist.$.timestamp": entry["timestamp"]},
+    }
+    line_filter = {"username": username, "wishlist.product": entry["product"]}
+
+    result = await async_user_collection.update_one(line_filter, line_update)
+    if result.matched_count:
+        return
+    try:
+        await async_user_collection.update_one(
+            {"username": username, "wishlist.product": {"$ne": entry["product"]}},
+            {"$push": {"wishlist": entry}, "$inc": {"wishlist_rev": 1}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The line appeared between the two updates
+        await async_user_collection.update_one(line_filter, line_update)
+
+
+async def take_wishlist_line(username: str, names: list, quantity):
+    """
+    Decrement (quantity=int) or drop (quantity=None) the wishlist line whose product is in
+    `names` and pull it once it reaches 0, in one find_one_and_update.
+    Returns the line as it was before, or None if not found.
+    """
+    line = "$$line"
+    new_quantity = 0 if quantity is None else {"$subtract": [line + ".quantity", quantity]}
+    matches = {"$in": [line + ".product", {"$literal": names}]}
+
+    pipeline = [{"$set": {
+        "wishlist": {"$filter": {
+            "input": {"$map": {"input": "$wishlist", "as": "line", "in": {"$cond": [
+                matches,
+                {
+                    **{field: f"{line}.{field}" for field in WISHLIST_LINE_FIELDS},
+                    "quantity": new_quantity,
+                    "reserved": {"$min": [{"$ifNull": [line + ".reserved", 0]}, new_quantity]},
+                },
+                line,
+            ]}}},
+            "as": "line",
+            "cond": {"$gt": [line + ".quantity", 0]},
+        }},
+        "wishlist_rev": {"$add": [{"$ifNull": ["$wishlist_rev", 0]}, 1]},
+    }}]
+
+    before = await async_user_collection.find_one_and_update(
+        {"username": username, "wishlist.product": {"$in": names}},
+        pipeline,
+        projection={"_id": 0, "wishlist": {"$elemMatch": {"product": {"$in": names}}}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not before or not before.get("wishlist"):
+        return None
+    return before["wishlist"][0]
+
+
+def find_closest_line(query: str, lines: list):
+    """
+    Fuzzy match of a spoken product against the user's own wishlist lines
+    ("remove banana" -> "Bananas") for when the store resolver has no answer.
+    """
+    keys = [product_key(line.get("product", "")) for line in lines]
+    match = process.extractOne(product_key(query), keys, scorer=fuzz.ratio, score_cutoff=store_resolver.score_cutoff)
+    return lines[match[2]] if match else None
+
+
+async def take_closest_wishlist_line(username: str, query: str, quantity):
+    """take_wishlist_line for the wishlist line that best matches `query`."""
+    user = await async_user_collection.find_one({"username": username}, {"_id": 0, "wishlist.product": 1})
+    closest = find_closest_line(query, (user or {}).get("wishlist", []))
+    if not closest:
+        return None
+    return await take_wishlist_line(username, [closest["product"]], quantity)
+
+
+def unresolved_message(product: str) -> str:
+    if not store_resolver.loaded:
+        return "The store catalog is still loading, try again shortly"
+    return f"No similar item found in store for '{product}'"
+
+
+async def update_wishlist(username: str, llm_response: dict):
     try:
         if not validate_llm_response(llm_response):
             return {"error": "Invalid LLM response"}
@@ -56,64 +180,66 @@ def update_wishlist(username: str, llm_response: dict):
 
         # ======================= ADD =======================
         if action == "add":
-            # 🔎 Step 1: Try fuzzy search in store collection
-            store_products = list(store_collection.find({}, {"_id": 0, "product": 1, "category": 1, "quantity": 1}))
-            store_item = find_closest_product(llm_response["product"], store_products, key="product")
+            # 🔎 Step 1: Resolve against the resident store name index
+            store_item = store_resolver.resolve(llm_response["product"])
 
             if not store_item:
-                return {"error": f"No similar item found in store for '{llm_response['product']}'"}
+                return {"error": unresolved_message(llm_response["product"])}
 
-            store_quantity = store_item.get("quantity", 0)
             requested_quantity = int(llm_response.get("quantity", 1))
+            if requested_quantity < 1:
+                return {"error": "Quantity must be at least 1"}
 
-            # 🔎 Step 2: Validate stock
-            if requested_quantity > store_quantity:
+            # 🔎 Step 2: Reserve stock (conditional $inc, no read-then-compare race)
+            if not await reserve_stock(store_item["_id"], requested_quantity):
+                stock = await async_store_collection.find_one({"_id": store_item["_id"]}, {"_id": 0, "quantity": 1}) or {}
                 return {
-                    "error": f"Only {store_quantity} × {store_item['product']} available in store"
+                    "error": f"Only {stock.get('quantity', 0)} × {store_item['product']} available in store"
                 }
 
-            # ✅ Step 3: Add to wishlist + history
-            user_collection.update_one(
-                {"username": username},
-                {
-                    "$push": {
-                        "wishlist": {
-                            "product": store_item["product"],  # use official name
-                            "quantity": requested_quantity,
-                            "category": store_item.get("category", llm_response.get("category", "unknown")),
-                            "action": "add",
-                            "status": llm_response["status"],
-                            "timestamp": llm_response["timestamp"]
-                        }
-                    }
-                },
-                upsert=True
-            )
+            # ✅ Step 3: Merge into the wishlist line for this product
+            try:
+                await merge_wishlist_line(username, {
+                    "product": store_item["product"],  # use official name
+                    "quantity": requested_quantity,
+                    "reserved": requested_quantity,
+                    "category": store_item.get("category", llm_response.get("category", "unknown")),
+                    "action": "add",
+                    "status": llm_response["status"],
+                    "timestamp": llm_response["timestamp"]
+                })
+            except Exception:
+                await release_stock(store_item["product"], requested_quantity)
+                raise
 
             return {"message": f"Product '{store_item['product']}' added to wishlist", "data": llm_response}
 
         # =================== REMOVE / DELETE ==================
+        # "remove" takes `quantity` units off the line, "delete" drops the whole line
         elif action in ["remove", "delete"]:
-            user = user_collection.find_one({"username": username})
-            if not user or "wishlist" not in user:
-                return {"error": "No wishlist found"}
-
-            wishlist = user.get("wishlist", [])
-            closest = find_closest_product(llm_response["product"], wishlist)
+            store_item = store_resolver.resolve(llm_response["product"])
+            names = list(dict.fromkeys(
+                ([store_item["product"]] if store_item else []) + [llm_response["product"]]
+            ))
+            quantity = int(llm_response.get("quantity", 1)) if action == "remove" else None
+            if quantity is not None and quantity < 1:
+                return {"error": "Quantity must be at least 1"}
 
-            if not closest:
+            line = await take_wishlist_line(username, names, quantity)
+            if not line:
+                line = await take_closest_wishlist_line(username, llm_response["product"], quantity)
+            if not line:
                 return {"error": f"No matching product found in wishlist for '{llm_response['product']}'"}
 
-            # ✅ Remove matched product and add to history
-            user_collection.update_one(
-                {"username": username},
-                {
-                    "$pull": {"wishlist": {"product": closest["product"]}},
-                    "$push": {"historylist": llm_response}
-                }
-            )
+            # Give back the stock this line had reserved for the units removed
+            line_quantity = line.get("quantity", 0)
+            remaining = 0 if quantity is None else max(line_quantity - quantity, 0)
+            reserved = line.get("reserved", 0)
+            await release_stock(line["product"], reserved - min(reserved, remaining))
+            await record_event(username, llm_response)
+
             return {
-                "message": f"Product '{closest['product']}' removed from wishlist",
+                "message": f"Product '{line['product']}' removed from wishlist",
                 "data": llm_response
             }
 
@@ -125,6 +251,205 @@ def update_wishlist(username: str, llm_response: dict):
         return {"error": str(e)}
     
 
+# ======================= BATCH =======================
+BATCH_MAX_COMMANDS = int(os.getenv("WISHLIST_BATCH_MAX_COMMANDS", "100"))
+BATCH_WRITE_ATTEMPTS = 5
+
+
+def _prepare_batch(commands: list):
+    """Validate and resolve every command in one pass. Returns (results with errors filled in, planned commands)."""
+    results = [None] * len(commands)
+    planned = []   # (index, command, action, store item or None, quantity or None for delete)
+    for i, command in enumerate(commands):
+        if not validate_llm_response(command):
+            results[i] = {"error": "Invalid LLM response"}
+            continue
+        command = {**command, "timestamp": datetime.datetime.utcnow().isoformat()}
+        action = command["action"].lower()
+        if action not in ("add", "remove", "delete"):
+            results[i] = {"error": f"Unsupported action: {command['action']}"}
+            continue
+        quantity = None if action == "delete" else int(command.get("quantity", 1))
+        if quantity is not None and quantity < 1:
+            results[i] = {"error": "Quantity must be at least 1"}
+            continue
+        store_item = store_resolver.resolve(command["product"])
+        if action == "add" and not store_item:
+            results[i] = {"error": unresolved_message(command["product"])}
+            continue
+        planned.append((i, command, action, store_item, quantity))
+    return results, planned
+
+
+def _apply_to_lines(lines: list, planned: list):
+    """
+    Apply planned commands, in order, to a copy of the wishlist lines (same rules
+    as update_wishlist). Returns (new lines, {index: result}, stock to release by product).
+    """
+    lines = [dict(line) for line in lines]
+    outcomes, releases = {}, {}
+    for i, command, action, store_item, quantity in planned:
+        if action == "add":
+            line = next((l for l in lines if l.get("product") == store_item["product"]), None)
+            if line:
+                line["quantity"] = line.get("quantity", 0) + quantity
+                line["reserved"] = line.get("reserved", 0) + quantity
+                line.update(status=command["status"], timestamp=command["timestamp"])
+            else:
+                lines.append({
+                    "product": store_item["product"],
+                    "quantity": quantity,
+                    "reserved": quantity,
+                    "category": store_item.get("category", command.get("category", "unknown")),
+                    "action": "add",
+                    "status": command["status"],
+                    "timestamp": command["timestamp"],
+                })
+            outcomes[i] = {"message": f"Product '{store_item['product']}' added to wishlist", "data": command}
+            continue
+
+        names = ([store_item["product"]] if store_item else []) + [command["product"]]
+        line = next((l for l in lines if l.get("product") in names), None) or find_closest_line(command["product"], lines)
+        if not line:
+            outcomes[i] = {"error": f"No matching product found in wishlist for '{command['product']}'"}
+            continue
+        remaining = 0 if quantity is None else max(line.get("quantity", 0) - quantity, 0)
+        reserved = line.get("reserved", 0)
+        releases[line["product"]] = releases.get(line["product"], 0) + reserved - min(reserved, remaining)
+        if remaining:
+            line.update(quantity=remaining, reserved=min(reserved, remaining))
+        else:
+            lines.remove(line)
+        outcomes[i] = {"message": f"Product '{line['product']}' removed from wishlist", "data": command}
+    return lines, outcomes, releases
+
+
+async def _write_wishlist(username: str, user, lines: list) -> bool:
+    """Replace the wishlist if nobody wrote it since `user` was read; False means re-read and retry."""
+    if user is None:
+        try:
+            await async_user_collection.insert_one({"username": username, "wishlist": lines, "wishlist_rev": 1})
+            return True
+        except DuplicateKeyError:
+            return False
+    rev = user.get("wishlist_rev")
+    result = await async_user_collection.update_one(
+        {"username": username, "wishlist_rev": rev if rev is not None else {"$exists": False}},
+        {"$set": {"wishlist": lines}, "$inc": {"wishlist_rev": 1}},
+    )
+    return result.modified_count == 1
+
+
+async def update_wishlist_batch(username: str, commands: list) -> dict:
+    """
+    Apply many update_wishlist commands with one read and one write of the user
+    document. Products are resolved in one pass against the resident catalog and
+    stock for every add is reserved concurrently; the new wishlist is written
+    with a wishlist_rev guard and recomputed if another write got in between.
+    Returns {"results": [...]} with one result per command, in order.
+    """
+    if not isinstance(commands, list) or not commands:
+        return {"error": "No commands given"}
+    if len(commands) > BATCH_MAX_COMMANDS:
+        return {"error": f"At most {BATCH_MAX_COMMANDS} commands per batch"}
+
+    try:
+        results, planned = _prepare_batch(commands)
+
+        # 🔎 Reserve stock for every add at once (each one is still a conditional $inc)
+        adds = [p for p in planned if p[2] == "add"]
+        reserved = await asyncio.gather(*(reserve_stock(store_item["_id"], quantity)
+                                          for _, _, _, store_item, quantity in adds))
+        short = {p[0]: p[3] for p, ok in zip(adds, reserved) if not ok}
+        if short:
+            stock = {doc["_id"]: doc.get("quantity", 0) async for doc in async_store_collection.find(
+                {"_id": {"$in": [item["_id"] for item in short.values()]}}, {"quantity": 1})}
+            for i, item in short.items():
+                results[i] = {"error": f"Only {stock.get(item['_id'], 0)} × {item['product']} available in store"}
+            planned = [p for p in planned if p[0] not in short]
+        held = {}
+        for _, _, action, store_item, quantity in planned:
+            if action == "add":
+                held[store_item["product"]] = held.get(store_item["product"], 0) + quantity
+
+        # ✅ One read + one guarded write of the user document
+        try:
+            for _ in range(BATCH_WRITE_ATTEMPTS):
+                user = await async_user_collection.find_one(
+                    {"username": username}, {"_id": 0, "wishlist": 1, "wishlist_rev": 1}
+                )
+                lines, outcomes, releases = _apply_to_lines((user or {}).get("wishlist", []), planned)
+                if not any("error" not in outcome for outcome in outcomes.values()):
+                    break  # nothing to write
+                if await _write_wishlist(username, user, lines):
+                    break
+            else:
+                raise RuntimeError("Wishlist is being changed concurrently, try again")
+        except Exception:
+            await release_stock_many(held)
+            raise
+
+        for i, outcome in outcomes.items():
+            results[i] = outcome
+        removed = [outcome["data"] for outcome in outcomes.values()
+                   if "error" not in outcome and outcome["data"]["action"].lower() != "add"]
+        await asyncio.gather(release_stock_many(releases), record_events(username, removed))
+
+        applied = sum("error" not in result for result in results)
+        return {
+            "message": f"{applied} of {len(results)} commands applied",
+            "applied": applied,
+            "failed": len(results) - applied,
+            "results": results,
+        }
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# ======================= LEGACY DUPLICATE LINES =======================
+# Wishlists written before merge_wishlist_line pushed a new line on every add, so
+# one product can have several lines; the line updates above only expect one.
+DUPLICATE_LINES = {"username": {"$type": "string"}, "$expr": {"$lt": [
+    {"$size": {"$setUnion": [{"$ifNull": ["$wishlist.product", []]}]}},
+    {"$size": {"$ifNull": ["$wishlist", []]}},
+]}}
+
+
+def merge_duplicate_lines(lines: list) -> list:
+    """One line per product: quantities and reservations summed, latest timestamp, first line's other fields."""
+    merged = {}
+    for line in lines:
+        kept = merged.get(line.get("product"))
+        if kept is None:
+            merged[line.get("product")] = dict(line)
+            continue
+        kept["quantity"] = int(kept.get("quantity") or 0) + int(line.get("quantity") or 0)
+        kept["reserved"] = int(kept.get("reserved") or 0) + int(line.get("reserved") or 0)
+        kept["timestamp"] = max(str(kept.get("timestamp") or ""), str(line.get("timestamp") or ""))
+    return list(merged.values())
+
+
+async def migrate_duplicate_wishlist_lines() -> int:
+    """
+    Merge duplicate wishlist lines once per user. Runs in every worker's startup:
+    each write is guarded by wishlist_rev, so a user written concurrently (by a
+    request or another worker) is simply read again. Returns the number of users merged here.
+    """
+    merged = 0
+    while True:
+        user = await async_user_collection.find_one(
+            DUPLICATE_LINES, {"_id": 0, "username": 1, "wishlist": 1, "wishlist_rev": 1}
+        )
+        if user is None:
+            break
+        if await _write_wishlist(user["username"], user, merge_duplicate_lines(user["wishlist"])):
+            merged += 1
+    if merged:
+        print(f"Merged duplicate wishlist lines of {merged} users")
+    return merged
+
+
 # --- New helper: Normalize text for flexible user phrases ---
 def normalize_user_text(text: str) -> str:
 
@@ -137,7 +462,9 @@ def normalize_user_text(text: str) -> str:
     # Simple replacements for shopping list intent
     patterns = [
         (r"(i want to buy|add|put|include)\s+(.*)", r"add \2 to list"),
-        (r"(remove|delete|take out)\s+(.*)", r"remove \2 from list"),
+        # "delete" drops the whole line, "remove" takes units off it (see update_wishlist)
+        (r"(delete)\s+(.*)", r"delete \2 from list"),
+        (r"(remove|take out)\s+(.*)", r"remove \2 from list"),
         (r"(show|display|what's in|list items)", r"show my list"),
     ]
 
@@ -0,0 +1,179 @@
+import datetime
+import os
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from db import async_history_collection, async_user_collection
+
+# history.py
+# Wishlist command history, kept out of the user document.
+# Events are appended to per-user day buckets of at most BUCKET_SIZE entries:
+#   {username, day: "2024-05-01", first, last, count, events: [...]}
+# so a wishlist read never loads history and no document grows without bound.
+# A bucket with count == BUCKET_SIZE is closed; new events go to a fresh one.
+
+BUCKET_SIZE = int(os.getenv("HISTORY_BUCKET_SIZE", "200"))
+MAX_PAGE_SIZE = 200
+
+
+def _day(timestamp: str) -> str:
+    return timestamp[:10]
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+async def record_event(username: str, event: dict):
+    """Append one event to the user's open bucket for its day (a new bucket is upserted once it fills)."""
+    event = dict(event)
+    timestamp = event.setdefault("timestamp", _now())
+    await async_history_collection.update_one(
+        {"username": username, "day": _day(timestamp), "count": {"$lt": BUCKET_SIZE}},
+        {
+            "$push": {"events": event},
+            "$inc": {"count": 1},
+            "$min": {"first": timestamp},
+            "$max": {"last": timestamp},
+        },
+        upsert=True,
+    )
+
+
+async def record_events(username: str, events: list):
+    """record_event for many events: one upsert per day instead of one per event."""
+    by_day = {}
+    for event in events:
+        event = dict(event)
+        by_day.setdefault(_day(event.setdefault("timestamp", _now())), []).append(event)
+
+    for day, day_events in by_day.items():
+        for start in range(0, len(day_events), BUCKET_SIZE):
+            chunk = day_events[start:start + BUCKET_SIZE]
+            timestamps = [e["timestamp"] for e in chunk]
+            result = await async_history_collection.update_one(
+                # Only a bucket with room for the whole chunk, so none grows past BUCKET_SIZE
+                {"username": username, "day": day, "count": {"$lte": BUCKET_SIZE - len(chunk)}},
+                {
+                    "$push": {"events": {"$each": chunk}},
+                    "$inc": {"count": len(chunk)},
+                    "$min": {"first": min(timestamps)},
+                    "$max": {"last": max(timestamps)},
+                },
+                upsert=True,
+            )
+            if result.upserted_id is not None:
+                # The chunk spilled into a new bucket: close the day's partly filled one so
+                # later single events don't land in it and overlap the new bucket in time
+                await async_history_collection.update_many(
+                    {"username": username, "day": day, "count": {"$lt": BUCKET_SIZE},
+                     "_id": {"$ne": result.upserted_id}},
+                    {"$set": {"count": BUCKET_SIZE}},
+                )
+
+
+def _parse_cursor(before: str):
+    """
+    `before` is a timestamp (events strictly older), or a `next_before` cursor
+    "timestamp~n": events at that timestamp too, minus the n already returned.
+    """
+    timestamp, separator, seen = before.partition("~")
+    return timestamp, bool(separator), int(seen or 0)
+
+
+async def read_history(username: str, limit: int = 50, before: str = None) -> dict:
+    """
+    Newest-first page of events. Pass the returned `next_before` as `before`
+    to get the next page; it is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = {"username": username}
+    timestamp, inclusive, seen = _parse_cursor(before) if before else (None, False, 0)
+    if timestamp:
+        query["first"] = {"$lte" if inclusive else "$lt": timestamp}
+
+    # (timestamp, bucket id, position) orders events totally, including equal timestamps
+    candidates = []
+    wanted = seen + limit + 1
+    cursor = async_history_collection.find(query, {"events": 1, "last": 1}).sort("last", -1)
+    async for bucket in cursor:
+        # Buckets may overlap in time, but none after this one has anything newer than its
+        # `last`, so stop once enough events are strictly newer than that
+        if len(candidates) >= wanted and candidates[wanted - 1][0] > bucket.get("last", ""):
+            break
+        bucket_id = str(bucket["_id"])
+        for position, event in enumerate(bucket.get("events", [])):
+            event_time = event.get("timestamp", "")
+            if timestamp and (event_time > timestamp or (event_time == timestamp and not inclusive)):
+                continue
+            candidates.append((event_time, bucket_id, position, event))
+        candidates.sort(key=lambda c: c[:3], reverse=True)
+
+    # Only events at the cursor timestamp can have been returned already, and they sort first
+    page = candidates[seen:seen + limit]
+    next_before = None
+    if len(candidates) > seen + limit:
+        last_time = page[-1][0]
+        returned = sum(1 for c in page if c[0] == last_time) + (seen if last_time == timestamp else 0)
+        next_before = f"{last_time}~{returned}"
+    return {"history": [c[3] for c in page], "next_before": next_before}
+
+
+# =================== LEGACY MIGRATION ===================
+async def migrate_legacy_history(batch_size: int = 100) -> int:
+    """
+    Move `historylist` arrays left on user documents into history buckets and
+    unset them. Runs in every worker's startup: each user is claimed atomically
+    (unset and returned in one find_one_and_update), so concurrent workers never
+    migrate the same history twice. Returns the number of users this call migrated.
+    """
+    migrated = 0
+    while True:
+        users = []
+        while len(users) < batch_size:
+            user = await async_user_collection.find_one_and_update(
+                {"historylist": {"$exists": True}},
+                {"$unset": {"historylist": ""}},
+                projection={"username": 1, "historylist": 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if user is None:
+                break
+            users.append(user)
+        if not users:
+            break
+        try:
+            await _insert_buckets(users)
+        except Exception:
+            # Put the claimed events back so the next startup retries them
+            await async_user_collection.bulk_write([
+                UpdateOne({"_id": user["_id"]}, {"$push": {"historylist": {"$each": user.get("historylist") or []}}})
+                for user in users
+            ], ordered=False)
+            raise
+        migrated += len(users)
+    if migrated:
+        print(f"Moved history of {migrated} users to the history collection")
+    return migrated
+
+
+async def _insert_buckets(users: list):
+    buckets = []
+    for user in users:
+        by_day = {}
+        for event in user.get("historylist") or []:
+            event = dict(event)
+            by_day.setdefault(_day(event.setdefault("timestamp", "")), []).append(event)
+        for day, events in sorted(by_day.items()):
+            events.sort(key=lambda e: e["timestamp"])
+            for i in range(0, len(events), BUCKET_SIZE):
+                chunk = events[i:i + BUCKET_SIZE]
+                buckets.append(InsertOne({
+                    "username": user["username"],
+                    "day": day,
+                    "first": chunk[0]["timestamp"],
+                    "last": chunk[-1]["timestamp"],
+                    "count": BUCKET_SIZE,  # closed: new events go to fresh buckets
+                    "events": chunk,
+                }))
+
+    if buckets:
+        await async_history_collection.bulk_write(buckets, ordered=False)
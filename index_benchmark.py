@@ -0,0 +1,97 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import faiss
+from vector_index import INDEX_TYPES, build_index
+
+# index_benchmark.py
+# Recall and latency of each store index backend against the exact flat baseline.
+#
+#   python index_benchmark.py --items 200000 --queries 1000
+#   python index_benchmark.py --vectors catalog.npy --types flat hnsw ivfpq --metric ip
+#
+# Without --vectors it uses clustered random 384-d vectors (same shape as MiniLM).
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, size=n)] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def index_size_mb(index) -> float:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".faiss") as f:
+        path = f.name
+    try:
+        faiss.write_index(index.index, path)
+        return os.path.getsize(path) / 1e6
+    finally:
+        os.remove(path)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int, types: list, metric: str) -> list:
+    results = []
+    truth = None
+    for kind in ["flat"] + [t for t in types if t != "flat"]:
+        started = time.perf_counter()
+        index = build_index(vectors, kind=kind, metric=metric)
+        build_seconds = time.perf_counter() - started
+
+        # One query at a time, like a /recommendations request with a single wishlist item
+        latencies = []
+        found = np.empty((len(queries), k), dtype=np.int64)
+        for i, query in enumerate(queries):
+            started = time.perf_counter()
+            _, rows = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - started)
+            found[i] = rows[0]
+        if truth is None:
+            truth = found
+
+        latencies = np.array(latencies) * 1000
+        results.append({
+            "type": index.kind,
+            "build_s": build_seconds,
+            "size_mb": index_size_mb(index),
+            "recall": recall_at_k(truth, found),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare store index backends with the flat baseline")
+    parser.add_argument("--vectors", help=".npy matrix of catalog embeddings (default: synthetic)")
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--metric", default="l2", choices=("l2", "ip"))
+    args = parser.parse_args()
+
+    vectors = np.load(args.vectors).astype("float32") if args.vectors else synthetic_vectors(args.items, args.dim)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed catalog items, like wishlist names close to a product
+    queries = vectors[rng.integers(0, len(vectors), size=args.queries)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype("float32")
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {args.queries} queries, k={args.k}, metric={args.metric}")
+    print(f"{'type':<8}{'build s':>10}{'size MB':>10}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in run(vectors, queries, args.k, args.types, args.metric):
+        print(f"{r['type']:<8}{r['build_s']:>10.2f}{r['size_mb']:>10.1f}{r['recall']:>9.3f}"
+              f"{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import asyncio
+import os
+from db import async_user_collection
+
+# live_updates.py
+# Server-pushed wishlist and recommendation updates for GET /events/{username} (SSE).
+# Subscribers of one user share a state per worker: after a write the wishlist is
+# read once, diffed against what was last pushed, and the diff plus refreshed
+# recommendations go to every subscriber. Writes handled by other workers are
+# picked up by polling wishlist_rev of the subscribed users (one $in query every
+# LIVE_UPDATES_POLL_SECONDS). Catalog changes that can alter rankings are
+# coalesced over LIVE_UPDATES_CATALOG_DELAY_SECONDS into one pass over the
+# subscribers, and a user only gets an event if their result actually changed.
+# Everything here runs on the event loop except catalog_changed(), which the
+# store index thread calls.
+
+POLL_SECONDS = float(os.getenv("LIVE_UPDATES_POLL_SECONDS", "2"))
+KEEPALIVE_SECONDS = float(os.getenv("LIVE_UPDATES_KEEPALIVE_SECONDS", "15"))
+CATALOG_DELAY_SECONDS = float(os.getenv("LIVE_UPDATES_CATALOG_DELAY_SECONDS", "1"))
+QUEUE_SIZE = 64
+WISHLIST_PROJECTION = {"_id": 0, "wishlist": 1, "wishlist_rev": 1}
+
+
+def wishlist_diff(before: dict, after: dict) -> dict:
+    """before/after: {product: line}. Lines that are new or changed, and products that are gone."""
+    return {
+        "upserted": [line for product, line in after.items() if before.get(product) != line],
+        "removed": [product for product in before if product not in after],
+    }
+
+
+def _lines(user) -> dict:
+    return {line["product"]: line for line in (user or {}).get("wishlist", [])}
+
+
+class _UserState:
+    def __init__(self):
+        self.queues = set()
+        self.rev = None      # wishlist_rev last pushed
+        self.lines = {}      # product -> line last pushed
+        self.dirty = False
+        self.refreshing = False
+        self.recommendations = None  # last recommendations event body pushed
+
+    def user_doc(self) -> dict:
+        return {"wishlist": list(self.lines.values()), "wishlist_rev": self.rev}
+
+
+class LiveUpdates:
+    def __init__(self, recommend, poll_interval: float = POLL_SECONDS, catalog_delay: float = CATALOG_DELAY_SECONDS):
+        """recommend: async (username, user doc) -> /recommendations response body."""
+        self.recommend = recommend
+        self.poll_interval = poll_interval
+        self.catalog_delay = catalog_delay
+        self._users = {}
+        self._loop = None
+        self._poller = None
+        self._catalog_pending = False
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._poller = asyncio.ensure_future(self._poll())
+
+    def stop(self):
+        if self._poller:
+            self._poller.cancel()
+
+    def has_subscribers(self, username: str) -> bool:
+        return username in self._users
+
+    async def subscribe(self, username: str) -> asyncio.Queue:
+        """Queue of events for one connection; starts with the full wishlist and recommendations."""
+        state = self._users.setdefault(username, _UserState())
+        if state.rev is None:
+            user = await async_user_collection.find_one({"username": username}, WISHLIST_PROJECTION)
+            if state.rev is None:  # a refresh may have filled it in meanwhile
+                state.rev, state.lines = (user or {}).get("wishlist_rev", 0), _lines(user)
+
+        queue = asyncio.Queue(QUEUE_SIZE)
+        queue.put_nowait({"type": "wishlist", "snapshot": True, "rev": state.rev,
+                          "items": list(state.lines.values())})
+        state.queues.add(queue)
+        try:
+            event = {"type": "recommendations", "rev": state.rev, **await self.recommend(username, state.user_doc())}
+            state.recommendations = event
+            self._put(queue, event)
+        except Exception as e:
+            print(f"Live recommendations for {username} failed:", e)
+        return queue
+
+    def unsubscribe(self, username: str, queue: asyncio.Queue):
+        state = self._users.get(username)
+        if state is None:
+            return
+        state.queues.discard(queue)
+        if not state.queues:
+            del self._users[username]
+
+    def notify(self, username: str):
+        """Call after writing username's wishlist; bursts of writes coalesce into one push."""
+        state = self._users.get(username)
+        if state is None:
+            return
+        state.dirty = True
+        if not state.refreshing:
+            state.refreshing = True
+            asyncio.ensure_future(self._refresh_loop(username, state))
+
+    def catalog_changed(self, snapshot=None):
+        """
+        Ranking-change listener (any thread): refresh every subscriber's
+        recommendations once the burst of changes has settled.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule_catalog_push)
+
+    # ===================== INTERNALS =======================
+    def _schedule_catalog_push(self):
+        if self._catalog_pending or not self._users:
+            return
+        self._catalog_pending = True
+        self._loop.call_later(self.catalog_delay, lambda: asyncio.ensure_future(self._push_all_recommendations()))
+
+    async def _push_all_recommendations(self):
+        self._catalog_pending = False
+        # One user at a time: a catalog change shouldn't flood the threadpool
+        for username, state in list(self._users.items()):
+            if self._users.get(username) is state:
+                await self._push_recommendations(username, state, state.user_doc())
+
+    async def _refresh_loop(self, username: str, state: _UserState):
+        try:
+            while state.dirty:
+                state.dirty = False
+                await self._refresh(username, state)
+        except Exception as e:
+            print(f"Live update for {username} failed:", e)
+        finally:
+            state.refreshing = False
+
+    async def _refresh(self, username: str, state: _UserState):
+        user = await async_user_collection.find_one({"username": username}, WISHLIST_PROJECTION)
+        rev = (user or {}).get("wishlist_rev", 0)
+        if rev == state.rev:
+            return
+        lines = _lines(user)
+        # base_rev lets a client that missed an event notice and re-fetch
+        event = {"type": "wishlist", "rev": rev, "base_rev": state.rev, **wishlist_diff(state.lines, lines)}
+        state.rev, state.lines = rev, lines
+        self._broadcast(state, event)
+        await self._push_recommendations(username, state, user)
+
+    async def _push_recommendations(self, username: str, state: _UserState, user: dict):
+        try:
+            result = await self.recommend(username, user)
+        except Exception as e:
+            print(f"Live recommendations for {username} failed:", e)
+            return
+        event = {"type": "recommendations", "rev": state.rev, **result}
+        if event == state.recommendations:
+            return  # nothing new for this user's streams
+        state.recommendations = event
+        self._broadcast(state, event)
+
+    def _broadcast(self, state: _UserState, event: dict):
+        for queue in list(state.queues):
+            self._put(queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop what it hasn't read and have it re-fetch everything
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"type": "resync"})
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._users:
+                continue
+            try:
+                cursor = async_user_collection.find(
+                    {"username": {"$in": list(self._users)}}, {"_id": 0, "username": 1, "wishlist_rev": 1}
+                )
+                async for doc in cursor:
+                    state = self._users.get(doc["username"])
+                    if state is not None and state.rev is not None and doc.get("wishlist_rev", 0) != state.rev:
+                        self.notify(doc["username"])
+            except Exception as e:
+                print("Live updates poll failed:", e)
@@ -0,0 +1,189 @@
+import os
+import random
+import threading
+import time
+import httpx
+from dotenv import load_dotenv
+from timing import count
+
+# llm_client.py
+# Shared, connection-pooled HTTP client for the Groq chat completions API.
+# One keep-alive (HTTP/2) connection pool per process, bounded retries with
+# jittered backoff on 429/5xx, and a circuit breaker so a struggling provider
+# fails fast instead of piling up blocked calls.
+
+load_dotenv()
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls and rejects calls
+    for `reset_timeout` seconds; then lets one trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """
+        None if the call is rejected, else the state it was let through in:
+        "closed", or "half-open" for the one trial call. Pass it back to
+        record_success / record_failure / release, so only the trial frees the trial slot.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return state
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return state
+            return None
+
+    def record_success(self, admitted: str = "closed"):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            if admitted == "half-open":
+                self._trial_running = False
+
+    def record_failure(self, admitted: str = "closed"):
+        with self._lock:
+            self._failures += 1
+            if admitted == "half-open":
+                self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self, admitted: str):
+        """End of an allowed call. A trial that ended without a recorded outcome frees the slot for the next one."""
+        if admitted == "half-open":
+            with self._lock:
+                self._trial_running = False
+
+
+class LLMClient:
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        pool_size: int = 20,
+        timeout: float = 10,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4,
+        max_elapsed: float = 20,
+        http2: bool = True,
+        breaker: CircuitBreaker = None,
+    ):
+        """
+        timeout: per-attempt request timeout in seconds.
+        max_elapsed: no new attempt is started after this many seconds in total.
+        """
+        self.url = url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_elapsed = max_elapsed
+        self.breaker = breaker or CircuitBreaker()
+        self._client = httpx.Client(
+            http2=http2,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5)),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def chat(self, payload: dict) -> dict:
+        """POST a chat completion request and return the decoded JSON body."""
+        admitted = self.breaker.allow()
+        if admitted is None:
+            count("llm_requests_total", outcome="circuit_open")
+            raise CircuitOpenError("LLM circuit breaker is open, skipping call")
+        try:
+            return self._post_with_retries(payload, admitted)
+        finally:
+            # e.g. cancellation or a non-httpx error mid trial must not leave the breaker stuck half-open
+            self.breaker.release(admitted)
+
+    def _post_with_retries(self, payload: dict, admitted: str = "closed") -> dict:
+        started = time.monotonic()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self._client.post(
+                    self.url,
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    json=payload,
+                )
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success(admitted)
+                    count("llm_requests_total", outcome="ok")
+                    return response.json()
+                last_error = f"HTTP {response.status_code}"
+                retry_after = _parse_retry_after(response.headers.get("retry-after"))
+
+            if attempt == self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            if time.monotonic() - started + delay > self.max_elapsed:
+                break
+            count("llm_retries_total")
+            time.sleep(delay)
+
+        self.breaker.record_failure(admitted)
+        count("llm_requests_total", outcome="error")
+        raise LLMError(f"LLM request failed after {attempt + 1} attempt(s): {last_error}")
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: spreads retries from many workers instead of synchronising them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def close(self):
+        self._client.close()
+
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+llm_client = LLMClient(
+    url=os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions"),
+    api_key=os.getenv("GROQ_API_KEY"),
+    pool_size=int(os.getenv("LLM_POOL_SIZE", "20")),
+    timeout=float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "10")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    http2=os.getenv("LLM_HTTP2", "1") != "0",
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+    ),
+)
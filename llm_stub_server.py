@@ -0,0 +1,106 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Answers the shopping-command prompt from prompt.py with a rule-based parse,
+with configurable latency and injected failures, so the LLM path can be
+exercised without network access or API keys.
+
+    python llm_stub_server.py --port 5055 --latency 0.3 --error-rate 0.05
+    GROQ_API_URL=http://127.0.0.1:5055/openai/v1/chat/completions uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+settings = {
+    "latency": float(os.getenv("LLM_STUB_LATENCY", "0")),
+    "error_rate": float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+    "error_status": int(os.getenv("LLM_STUB_ERROR_STATUS", "429")),
+}
+stats = {"requests": 0, "errors": 0}
+
+app = FastAPI()
+
+
+def parse_command(text: str) -> dict:
+    text = text.lower().strip()
+    action = "add"
+    if re.search(r"\bdelete\b", text):
+        action = "delete"
+    elif re.search(r"\b(remove|take out)\b", text):
+        action = "remove"
+
+    words = re.sub(r"\b(add|remove|delete|take out|to|from|my|the|list|please)\b", " ", text).split()
+    quantity = 1
+    if words and (words[0].isdigit() or words[0] in NUMBER_WORDS):
+        quantity = int(words[0]) if words[0].isdigit() else NUMBER_WORDS[words[0]]
+        words = words[1:]
+
+    if not words:
+        return {key: "error: no product in command" for key in ("product", "quantity", "category", "action", "status")}
+    return {
+        "product": " ".join(words),
+        "quantity": quantity,
+        "category": "unknown",
+        "action": action,
+        "status": "ai_generated",
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if settings["latency"]:
+        await asyncio.sleep(settings["latency"])
+
+    if random.random() < settings["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "stub injected failure"}},
+                            status_code=settings["error_status"], headers={"Retry-After": "0"})
+
+    prompt = body["messages"][-1]["content"]
+    match = re.search(r'User command: "(.*)"', prompt)
+    content = json.dumps(parse_command(match.group(1) if match else ""))
+    return {
+        "id": f"stub-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+    }
+
+
+def run_in_thread(host: str = "127.0.0.1", port: int = 5055) -> uvicorn.Server:
+    """Start the stub in a background thread (for tests/benchmarks); call server.should_exit = True to stop."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Groq API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency", type=float, default=settings["latency"], help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"], help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=settings["error_status"])
+    args = parser.parse_args()
+
+    settings.update(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -1,18 +1,30 @@
-from fastapi import FastAPI, UploadFile, File
-import assemblyai as aai
-import tempfile
+from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect, Response, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.websockets import WebSocketState
+import asyncio
+from contextlib import asynccontextmanager
+import json
 import os
+import threading
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from helper_function import validate_llm_response
-from db import user_collection
-from db import store_collection
-from sentence_transformers import SentenceTransformer
-import faiss
-from rapidfuzz import fuzz, process
-import numpy as np
-from helper_function import update_wishlist, normalize_user_text
+from db import async_user_collection
+from db import user_collection, async_client, ensure_indexes
+from helper_function import update_wishlist, update_wishlist_batch, normalize_user_text, migrate_duplicate_wishlist_lines
 from prompt import process_command
+from ml_backend import LazyML, ML_LOAD_MODE
+from product_resolver import store_resolver
+from upstream import llm_upstream
+from parse_cache import ParseCache
+from command_parser import parse_locally, parse_items
+from transcription import transcribe, create_session, STREAM_MAX_SECONDS
+from history import read_history, migrate_legacy_history
+from recommendation_cache import RecommendationCache
+from timing import timed, log, render_metrics, RequestContextMiddleware
+from responses import json_response, etag_matches, not_modified, dumps, CompressionMiddleware
+from live_updates import LiveUpdates, KEEPALIVE_SECONDS
 
 
 
@@ -21,7 +33,28 @@ load_dotenv()
 
 
 # ===================== APP START =======================
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    # Serve wishlist routes right away; everything slow happens in the background
+    if ML_LOAD_MODE == "background":
+        ml.start()
+    store_resolver.load_in_background()
+    store_resolver.start_polling(lambda: ml.ready)
+    background = [
+        asyncio.ensure_future(migrate_legacy_history()),
+        asyncio.ensure_future(migrate_duplicate_wishlist_lines()),
+    ]
+    live_updates.start()
+    yield
+    live_updates.stop()
+    store_resolver.stop_polling()
+    for task in background:
+        task.cancel()
+    ml.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for frontend testing
 app.add_middleware(
@@ -30,83 +63,223 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag"],
 )
+# gzip (brotli when installed) for JSON bodies over COMPRESSION_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+# Request IDs (X-Request-ID), per-route latency histograms, one log line per request with its stage spans
+app.add_middleware(RequestContextMiddleware)
 
 
 
 # =================== ML EMBEDDINGS ===================
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+# Embedding model + store vector index: in this process, or shared by all workers
+# through ml_service.py when ML_SERVICE_SOCKET is set. Loaded off the startup path;
+# ml.get() raises MLNotReady until it's done.
+ml = LazyML()
 
-def build_store_index():
-    store_products = list(store_collection.find({}, {"_id": 0, "product": 1, "category": 1, "price": 1}))
-    if not store_products:
-        return None, []
+def encode_texts(texts):
+    return ml.get().encode(texts)
 
-    product_texts = [p["product"] for p in store_products]
-    vectors = embedder.encode(product_texts, convert_to_numpy=True)
+ml.subscribe(store_resolver.rebuild)  # keep the product name resolver in sync
 
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(vectors)
 
-    return index, store_products
+# ==================== PARSE CACHE ====================
+# Most commands normalize to a handful of forms; skip the LLM round trip for repeats
+parse_cache = ParseCache(
+    max_items=int(os.getenv("PARSE_CACHE_MAX_ITEMS", "10000")),
+    ttl=float(os.getenv("PARSE_CACHE_TTL_SECONDS", "3600")),
+    encode=encode_texts if os.getenv("PARSE_CACHE_SEMANTIC", "0") == "1" else None,
+    similarity_threshold=float(os.getenv("PARSE_CACHE_SIMILARITY", "0.95")),
+)
 
-faiss_index, store_products = build_store_index()
 
+async def parse_command_text(normalized_text: str) -> dict:
+    """process_command with the parse cache in front of it."""
+    # The near-duplicate tier needs the embedder; until it's loaded only exact hits count
+    semantic = parse_cache.semantic and ml.ready
+    cached = parse_cache.get(normalized_text, similar_next=semantic)
+    if cached is None and semantic:
+        cached = await run_in_threadpool(parse_cache.get_similar, normalized_text)
+    if cached is not None:
+        return cached
+
+    with timed("parse.llm"):
+        llm_response = await llm_upstream.run(process_command, normalized_text)
+    if validate_llm_response(llm_response):
+        if semantic:
+            await run_in_threadpool(parse_cache.put, normalized_text, llm_response)
+        else:
+            parse_cache.put(normalized_text, llm_response, embed=False)
+    return llm_response
 
 
 
 
-# ======================= ASSEMBLY AI ===================
+# ======================= SPEECH → COMMAND ===================
 
-ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
-aai.settings.api_key = ASSEMBLYAI_API_KEY
+async def understand_text(text: str, pending_parses: dict = None) -> dict:
+    """
+    Transcript → normalized text → parsed command, shaped like the
+    /recognise_text_to_llm response. `pending_parses` holds LLM parses already
+    started on partial transcripts (normalized text -> task).
+    """
+    log("Original transcript:", text)
+
+    # ✅ NLP step: normalize/understand varied user phrasing
+    with timed("normalize"):
+        normalized_text = normalize_user_text(text)
+    log("Normalized text:", normalized_text)
+
+    # Simple commands are parsed locally; anything unclear goes to the LLM (cached)
+    with timed("parse.local"):
+        llm_response = parse_locally(normalized_text)
+        items = parse_items(normalized_text)[1] if llm_response is None else []
+    if len(items) > 1:
+        return await understand_items(text, normalized_text, items)
+    if llm_response is None:
+        pending = (pending_parses or {}).pop(normalized_text, None)
+        with timed("parse.remote"):
+            llm_response = await (pending or parse_command_text(normalized_text))
+    log("LLM response:", llm_response)
+
+    with timed("validate"):
+        valid = validate_llm_response(llm_response)
+    if valid:
+        # ✅ send to frontend for confirmation
+        return {
+            "recognized_text": text,
+            "normalized_text": normalized_text,
+            "llm_response": llm_response
+        }
+    return {"error": "Invalid AI response"}
+
+
+async def understand_items(text: str, normalized_text: str, items: list) -> dict:
+    """
+    Several items in one utterance ("add milk, two apples and bread"): segments the
+    local parser couldn't handle go to the LLM one by one, concurrently. The result
+    adds `items` (every parsed command, for /update_wishlist/{username}/batch) and
+    keeps `llm_response` as the first one for single-item clients.
+    """
+    unparsed = [command for command, parsed in items if parsed is None]
+    with timed("parse.remote"):
+        remote = await asyncio.gather(*(parse_command_text(command) for command in unparsed))
+    remote = dict(zip(unparsed, remote))
+
+    parsed_items = []
+    failed = []
+    for command, parsed in items:
+        parsed = parsed if parsed is not None else remote[command]
+        if validate_llm_response(parsed):
+            parsed_items.append(parsed)
+        else:
+            failed.append(command)
+    log("Parsed items:", parsed_items, "unparsed:", failed)
 
+    if not parsed_items:
+        return {"error": "Invalid AI response"}
+    return {
+        "recognized_text": text,
+        "normalized_text": normalized_text,
+        "llm_response": parsed_items[0],
+        "items": parsed_items,
+        "unparsed": failed,
+    }
 
 
 @app.post("/recognise_text_to_llm")
 async def recognise_text_to_llm(file: UploadFile = File(...)):
     try:
-        print("/recognise_text_to_llm initiated")
-        # Save audio temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
-            temp_file.write(await file.read())
-            temp_path = temp_file.name
-
-        # AssemblyAI transcription (English only)
-        transcriber = aai.Transcriber()
-        transcript = transcriber.transcribe(
-            temp_path,
-            config=aai.TranscriptionConfig(language_code="en")
-        )
-
-        if transcript.status == aai.TranscriptStatus.error:
-            return {"error": transcript.error}
-
-        print("Original transcript:", transcript.text)
-
-        # ✅ NLP step: normalize/understand varied user phrasing
-        normalized_text = normalize_user_text(transcript.text)
-        print("Normalized text:", normalized_text)
-
-        # Process through your existing LLM logic
-        llm_response = process_command(normalized_text)
-        print("LLM response:", llm_response)
-
-        if validate_llm_response(llm_response):
-            # ✅ send to frontend for confirmation
-            return {
-                "recognized_text": transcript.text,
-                "normalized_text": normalized_text,
-                "llm_response": llm_response
-            }
-        else:
-            return {"error": "Invalid AI response"}
+        log("/recognise_text_to_llm initiated")
+        with timed("upload"):
+            audio = await file.read()
+
+        # Blocking SDK/HTTP calls run in bounded pools so the event loop stays free
+        with timed("transcribe"):
+            text = await transcribe(audio)
+        return await understand_text(text)
 
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.websocket("/ws/recognise")
+async def recognise_stream(websocket: WebSocket):
+    """
+    Streaming variant of /recognise_text_to_llm.
+    Client sends {"type": "start", "encoding": "pcm_s16le" | "webm", "sample_rate": 16000},
+    then binary audio chunks, then {"type": "stop"}.
+    Server sends {"type": "partial", ...} while audio arrives and one
+    {"type": "result", ...} (same fields as the POST route) at the end.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    pending_parses = {}
+    session = None
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    async def on_partial(text: str, end_of_turn: bool):
+        normalized_text = normalize_user_text(text)
+        parsed = parse_locally(normalized_text)
+        # Start the LLM parse as soon as a turn ends instead of waiting for "stop"
+        # (multi-item commands are parsed per item at the end)
+        if (parsed is None and end_of_turn and normalized_text not in pending_parses
+                and len(parse_items(normalized_text)[1]) <= 1):
+            pending_parses[normalized_text] = asyncio.ensure_future(parse_command_text(normalized_text))
+        try:
+            await send({"type": "partial", "text": text, "normalized_text": normalized_text, "llm_response": parsed})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    try:
+        async with asyncio.timeout(STREAM_MAX_SECONDS):
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes") is not None:
+                    if session is None:
+                        raise ValueError("Send a start message before audio")
+                    await session.feed(message["bytes"])
+                    continue
+
+                control = json.loads(message.get("text") or "{}")
+                if control.get("type") == "start" and session is None:
+                    session = create_session(
+                        on_partial,
+                        encoding=control.get("encoding", "webm"),
+                        sample_rate=int(control.get("sample_rate", 16000)),
+                    )
+                    await session.start()
+                elif control.get("type") == "stop":
+                    break
+
+            if session is None:
+                raise ValueError("No audio received")
+            text = await session.finish()
+            result = await understand_text(text, pending_parses)
+        await send({"type": "result", **result})
+
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        try:
+            await send({"type": "error", "error": str(e) or type(e).__name__})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+    finally:
+        for task in pending_parses.values():
+            task.cancel()
+        if session is not None:
+            await session.close()
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+
+
     
 
 @app.post("/update_wishlist/{username}")
@@ -114,118 +287,246 @@ async def update_wishlist_route(username: str, llm_response: dict):
     """
     Confirmed action from frontend → update MongoDB wishlist/history.
     """
-    result = update_wishlist(username, llm_response)
+    with timed("wishlist.update"):
+        result = await update_wishlist(username, llm_response)
+    if "error" not in result:
+        wishlist_changed(username)
+    return result
+
+
+@app.post("/update_wishlist/{username}/batch")
+async def update_wishlist_batch_route(username: str, body: dict):
+    """
+    Many confirmed actions at once: {"commands": [llm_response, ...]} (a multi-item
+    utterance's `items`, or commands queued while offline). Applied in order with
+    one wishlist write; returns one result per command.
+    """
+    with timed("wishlist.update_batch"):
+        result = await update_wishlist_batch(username, body.get("commands"))
+    if result.get("applied"):
+        wishlist_changed(username)
     return result
 
 
+def wishlist_changed(username: str):
+    """After a committed write: push the diff to the user's /events streams, or precompute for the next GET."""
+    if live_updates.has_subscribers(username):
+        live_updates.notify(username)
+    elif PRECOMPUTE_RECOMMENDATIONS:
+        # The frontend asks for recommendations right after a change; have them ready
+        asyncio.ensure_future(run_in_threadpool(refresh_recommendations, username))
+
+
 @app.get("/wishlist/{username}")
-async def get_wishlist(username: str):
+async def get_wishlist(username: str, request: Request):
     try:
-        user = user_collection.find_one({"username": username}, {"_id": 0, "wishlist": 1})
+        user = await async_user_collection.find_one({"username": username}, {"_id": 0, "wishlist": 1, "wishlist_rev": 1})
+        # Every wishlist write bumps wishlist_rev, so it versions the whole response
+        etag = f'W/"w{(user or {}).get("wishlist_rev", 0)}"'
+        if etag_matches(request, etag):
+            return not_modified(etag)
         if not user:
-            return {"wishlist": []}  # empty if user not found
-        return {"wishlist": user.get("wishlist", [])}
+            return json_response({"wishlist": []}, etag)  # empty if user not found
+        return json_response({"wishlist": user.get("wishlist", [])}, etag)
     except Exception as e:
         return {"error": str(e)}
 
 
-# =================================================================================================
-store_products = list(store_collection.find({}, {"_id": 0}))
+@app.get("/history/{username}")
+async def get_history(username: str, limit: int = 50, before: str = None):
+    """Newest-first wishlist history; pass `next_before` back as `before` for the next page."""
+    try:
+        return await read_history(username, limit=limit, before=before)
+    except Exception as e:
+        return {"error": str(e)}
 
-# Encode all store product names
-store_embeddings = embedder.encode([p["product"] for p in store_products], convert_to_numpy=True)
 
-# Create FAISS index
-d = store_embeddings.shape[1]  # embedding dimension
-faiss_index = faiss.IndexFlatL2(d)
-faiss_index.add(np.array(store_embeddings))
-# ================================================================================================
+# =================== RECOMMENDATIONS ===================
+# Results are cached per user until their wishlist_rev or the catalog's ranking_version
+# changes (stock counts that stay above zero don't count, so reservations keep the cache)
+recommendation_cache = RecommendationCache(max_items=int(os.getenv("RECOMMENDATION_CACHE_MAX_USERS", "10000")))
+PRECOMPUTE_RECOMMENDATIONS = os.getenv("RECOMMENDATION_PRECOMPUTE", "1") == "1"
+PRECOMPUTE_ACTIVE_USERS = int(os.getenv("RECOMMENDATION_PRECOMPUTE_USERS", "100"))
+PRECOMPUTE_DELAY_SECONDS = float(os.getenv("RECOMMENDATION_PRECOMPUTE_DELAY_SECONDS", "1"))
+RECOMMENDATION_PROJECTION = {"_id": 0, "wishlist.product": 1, "wishlist.category": 1, "wishlist_rev": 1}
 
 
-@app.get("/recommendations/{username}")
-def get_recommendations(username: str):
-    user = user_collection.find_one({"username": username}, {"wishlist": 1})
+def wishlist_note(user: dict):
+    """The short-circuit responses for users with nothing to recommend from, else None."""
     if not user or "wishlist" not in user:
         return {"recommendations": [], "note": "No wishlist found"}
-
-    wishlist = user["wishlist"]
-    if not wishlist:
+    if not user["wishlist"]:
         return {"recommendations": [], "note": "Wishlist empty"}
+    return None
 
-    wishlist_products = [item["product"].lower() for item in wishlist]
-    wishlist_categories = {item.get("category", "").lower() for item in wishlist}
-
-    # Embed wishlist items
-    wishlist_vectors = embedder.encode(wishlist_products, convert_to_numpy=True)
 
-    rec_candidates = {}
+def compute_recommendations(username: str, user: dict) -> dict:
+    with timed("recommend.compute"):
+        ranking_version, result = ml.get().recommend(user["wishlist"])
+    recommendation_cache.put(username, user.get("wishlist_rev", 0), ranking_version, result)
+    return result
 
-    for vec in wishlist_vectors:
-        distances, indices = faiss_index.search(vec.reshape(1, -1), k=20)  # fetch more candidates
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx == -1:
-                continue
 
-            candidate = store_products[idx]
+def refresh_recommendations(username: str):
+    """Background precompute (threadpool / store index thread), using the sync client."""
+    try:
+        user = user_collection.find_one({"username": username}, RECOMMENDATION_PROJECTION)
+        if ml.ready and wishlist_note(user) is None:
+            if not recommendation_cache.is_current(username, user.get("wishlist_rev", 0), ml.get().ranking_version):
+                compute_recommendations(username, user)
+    except Exception as e:
+        log("Recommendation precompute failed:", e)
 
-            # Skip if already in wishlist
-            if candidate["product"].lower() in wishlist_products:
-                continue
 
-            # Skip out of stock
-            if candidate.get("quantity", 0) <= 0:
-                continue
+def precompute_active_users():
+    for username in recommendation_cache.active_users(PRECOMPUTE_ACTIVE_USERS):
+        refresh_recommendations(username)
 
-            score = float(dist)
 
-            # Boost same category
-            if candidate.get("category", "").lower() in wishlist_categories:
-                score *= 0.8
-            else:
-                score *= 1.2
+class CoalescedTask:
+    """
+    Runs `func` on its own thread `delay` seconds after a trigger; triggers that
+    arrive before it starts fold into that one run.
+    """
 
-            prod_key = candidate["product"].lower()
-            if prod_key not in rec_candidates or score < rec_candidates[prod_key]["score"]:
-                rec_candidates[prod_key] = {"item": candidate, "score": score}
+    def __init__(self, func, delay: float):
+        self.func = func
+        self.delay = delay
+        self._pending = False
+        self._lock = threading.Lock()
 
-    # Sort by score
-    recs = sorted(rec_candidates.values(), key=lambda x: x["score"])
-    sorted_items = [r["item"] for r in recs]
+    def trigger(self, *args):
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        timer = threading.Timer(self.delay, self._run)
+        timer.daemon = True
+        timer.start()
 
-    # Hybrid strategy
-    final_recs = []
+    def _run(self):
+        with self._lock:
+            self._pending = False
+        try:
+            self.func()
+        except Exception as e:
+            log("Coalesced task failed:", e)
 
-    # Top 2 from same category
-    for r in sorted_items:
-        if r["category"].lower() in wishlist_categories:
-            final_recs.append(r)
-        if len(final_recs) >= 2:
-            break
 
-    # Top 2 from related categories
-    for r in sorted_items:
-        if r not in final_recs and r["category"].lower() not in wishlist_categories:
-            final_recs.append(r)
-        if len(final_recs) >= 4:
-            break
+if PRECOMPUTE_RECOMMENDATIONS:
+    # After a ranking-relevant catalog change, recompute recently active users once per
+    # burst on a timer thread (not the store index watcher)
+    ml.subscribe(CoalescedTask(precompute_active_users, PRECOMPUTE_DELAY_SECONDS).trigger, ranking_only=True)
 
-    # 1 surprise item
-    for r in sorted_items:
-        if r not in final_recs:
-            final_recs.append(r)
-            break
 
-    # 🔧 Fill up to 10 if fewer than 10
-    for r in sorted_items:
-        if r not in final_recs:
-            final_recs.append(r)
-        if len(final_recs) >= 10:
-            break
+@app.get("/recommendations/{username}")
+async def get_recommendations(username: str, request: Request):
+    with timed("recommend.read_wishlist"):
+        user = await async_user_collection.find_one({"username": username}, RECOMMENDATION_PROJECTION)
+
+    # The result depends only on the wishlist revision and the ranking-relevant catalog state,
+    # so stock reservations by other users don't change the ETag
+    etag = f'W/"r{(user or {}).get("wishlist_rev", 0)}-{ml.get().catalog_tag}"' if ml.ready else None
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    result = await recommendations_for(username, user)
+    return json_response(result, etag)
+
+
+async def recommendations_for(username: str, user: dict) -> dict:
+    """/recommendations body for an already-read user document (also pushed over /events)."""
+    note = wishlist_note(user)
+    if note:
+        return note
+
+    if not ml.ready:
+        ml.start()  # ML_LOAD_MODE=lazy: the first recommendation request triggers loading
+        return {"recommendations": [], "note": "Recommendations are loading, try again shortly"}
+
+    # Unchanged wishlist and catalog: a dict lookup instead of encode + search
+    result = recommendation_cache.get(username, user.get("wishlist_rev", 0), ml.get().ranking_version)
+    if result is None:
+        result = await run_in_threadpool(compute_recommendations, username, user)
+    return result
 
-    # Fallback
-    if not final_recs:
-        final_recs = store_products[:10]
 
-    return {"recommendations": final_recs[:10]}
+# =================== LIVE UPDATES ===================
+# One SSE stream per open frontend: wishlist diffs and refreshed recommendations are
+# pushed right after each write (and after catalog changes), so the page doesn't
+# follow every change with GET /wishlist + GET /recommendations.
+live_updates = LiveUpdates(recommendations_for)
+ml.subscribe(live_updates.catalog_changed, ranking_only=True)
 
 
+@app.get("/events/{username}")
+async def events(username: str):
+    """
+    text/event-stream of `wishlist` events (a snapshot first, then diffs with
+    rev/base_rev), `recommendations` events and `resync` (re-fetch everything).
+    """
+    queue = await live_updates.subscribe(username)
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:  # Starlette cancels the stream when the client disconnects
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"  # keeps proxies from closing an idle stream
+                    continue
+                yield b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+        finally:
+            live_updates.unsubscribe(username, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# =================== HEALTH ===================
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and the event loop is responsive."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready(response: Response):
+    """
+    Readiness: 200 once wishlist routes can be served (MongoDB reachable).
+    ML components load in the background and are reported, not waited for.
+    """
+    components = {"ml": ml.status(), "resolver": "ready" if store_resolver.loaded else "loading"}
+    try:
+        await async_client.admin.command("ping")
+        components["mongo"] = "ready"
+    except Exception as e:
+        components["mongo"] = f"error: {e}"
+
+    is_ready = components["mongo"] == "ready"
+    response.status_code = 200 if is_ready else 503
+    return {"ready": is_ready, "components": components}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker: request/stage/upstream latency histograms, cache hit counters."""
+    parse_stats = parse_cache.stats()
+    recommendation_stats = recommendation_cache.stats()
+    series = [
+        ("parse_cache_hits_total", "counter", parse_stats["exact_hits"], {"tier": "exact"}),
+        ("parse_cache_hits_total", "counter", parse_stats["similar_hits"], {"tier": "similar"}),
+        ("parse_cache_misses_total", "counter", parse_stats["misses"], {}),
+        ("parse_cache_items", "gauge", parse_stats["size"], {}),
+        ("recommendation_cache_hits_total", "counter", recommendation_stats["hits"], {}),
+        ("recommendation_cache_misses_total", "counter", recommendation_stats["misses"], {}),
+        ("recommendation_cache_items", "gauge", recommendation_stats["size"], {}),
+        ("ml_ready", "gauge", int(ml.ready), {}),
+    ]
+    if ml.ready:
+        series += ml.get().metrics()
+    return render_metrics(series)
@@ -0,0 +1,339 @@
+import base64
+import os
+import threading
+import time
+import uuid
+import numpy as np
+import httpx
+from db import store_collection, IN_MEMORY
+from recommender import rank_recommendations
+from timing import timed
+
+# ml_backend.py
+# Embedding model + store vector index behind one interface, in one of two places:
+#   LocalML   - loaded in this process (single worker, and inside ml_service.py)
+#   RemoteML  - a handle to ml_service.py over a Unix socket, so any number of
+#               uvicorn workers share one model and one index
+# ML_SERVICE_SOCKET selects RemoteML.
+
+ML_SERVICE_SOCKET = os.getenv("ML_SERVICE_SOCKET")
+ML_SERVICE_TIMEOUT_SECONDS = float(os.getenv("ML_SERVICE_TIMEOUT_SECONDS", "10"))
+ML_SERVICE_POLL_SECONDS = float(os.getenv("ML_SERVICE_POLL_SECONDS", "1"))
+# "background": start loading at startup; "lazy": on first use
+ML_LOAD_MODE = os.getenv("ML_LOAD_MODE", "background").lower()
+
+
+class MLNotReady(Exception):
+    pass
+
+
+def recommend_for_wishlist(snapshot, encode, wishlist: list) -> dict:
+    """CPU-bound part of /recommendations (encode + search + rank)."""
+    wishlist_products = [item["product"].lower() for item in wishlist]
+    wishlist_categories = {item.get("category", "").lower() for item in wishlist}
+
+    if snapshot.index is None:
+        return {"recommendations": [], "note": "Store is empty"}
+
+    # Embed wishlist items
+    with timed("recommend.encode"):
+        wishlist_vectors = encode(wishlist_products)
+
+    # Includes the recommend.search span
+    with timed("recommend.rank"):
+        final_recs = rank_recommendations(snapshot, wishlist_vectors, wishlist_products, wishlist_categories)
+
+    # Fallback
+    if not final_recs:
+        final_recs = [product for product in snapshot.products if product.get("product")][:10]
+
+    # Stock counts change with every reservation; results are cached per ranking_version,
+    # which ignores them, so they are left out rather than served stale
+    return {"recommendations": [without_stock(product) for product in final_recs[:10]]}
+
+
+def without_stock(product: dict) -> dict:
+    return {k: v for k, v in product.items() if k != "quantity"}
+
+
+def pack_vectors(matrix: np.ndarray) -> dict:
+    matrix = np.ascontiguousarray(matrix, dtype="float32")
+    return {"shape": list(matrix.shape), "data": base64.b64encode(matrix.tobytes()).decode("ascii")}
+
+
+def unpack_vectors(payload: dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype="float32").reshape(payload["shape"])
+
+
+class CatalogState:
+    """What RemoteML listeners get instead of a StoreSnapshot: versions only, no products."""
+
+    def __init__(self, version: int, rows_version: int, ranking_version: int = 0):
+        self.version = version
+        self.rows_version = rows_version
+        self.ranking_version = ranking_version
+        self.products = None
+        self.ids = None
+
+
+# ===================== IN PROCESS =======================
+# Heavy imports (torch / onnxruntime, faiss) happen inside LocalML so importing this module stays cheap
+class LocalML:
+    local = True
+
+    def __init__(self):
+        from embedders import create_embedder
+        from embedding_cache import EmbeddingCache
+        from store_index import StoreIndexManager
+
+        # Store versions count from 0 in every process; the instance ID tells them apart
+        self.instance = uuid.uuid4().hex[:8]
+
+        # torch or ONNX int8 MiniLM (EMBEDDING_BACKEND); concurrent cache misses from
+        # different requests share one forward pass (EMBEDDING_BATCHING)
+        self.embedder = create_embedder()
+
+        # Persistent text -> vector cache; known product names never hit the model again.
+        # Keyed by embedder name, so torch and ONNX vectors are never mixed.
+        self.embedding_cache = EmbeddingCache(
+            self.embedder,
+            self.embedder.name,
+            path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"),
+        )
+
+        # Built once; the watcher thread applies catalog inserts/updates/deletes incrementally
+        index_dir = os.getenv("STORE_INDEX_DIR")
+        self.store_index = StoreIndexManager(
+            store_collection,
+            self.encode,
+            poll_interval=float(os.getenv("STORE_INDEX_POLL_SECONDS", "30")),
+            use_change_stream=not IN_MEMORY,
+            # One directory per model: vectors from different models never share an index file
+            index_dir=os.path.join(index_dir, self.embedder.name) if index_dir else None,
+        )
+        self.store_index.build()
+        self.store_index.start_watcher()
+
+    def encode(self, texts: list) -> np.ndarray:
+        return self.embedding_cache.encode(texts)
+
+    @property
+    def version(self) -> int:
+        return self.store_index.snapshot.version
+
+    @property
+    def ranking_version(self) -> int:
+        """Changes only when recommendation results can (see StoreSnapshot.ranking_fingerprint)."""
+        return self.store_index.snapshot.ranking_version
+
+    @property
+    def catalog_tag(self) -> str:
+        """Identifies the ranking-relevant catalog state across processes (for recommendation ETags)."""
+        return f"{self.instance}.{self.ranking_version}"
+
+    def recommend(self, wishlist: list):
+        """Returns (ranking version the result was computed on, result)."""
+        # Take one snapshot so a concurrent index swap can't mix two catalog versions
+        snapshot = self.store_index.snapshot
+        return snapshot.ranking_version, recommend_for_wishlist(snapshot, self.encode, wishlist)
+
+    def subscribe(self, callback, ranking_only: bool = False):
+        """Call `callback(snapshot)` after every catalog change (ranking_only: only ranking changes)."""
+        self.store_index.subscribe(callback, ranking_only=ranking_only)
+
+    def metrics(self) -> list:
+        """Scrape-time series for timing.render_metrics."""
+        snapshot = self.store_index.snapshot
+        series = [
+            ("embedding_cache_hits_total", "counter", self.embedding_cache.hits, {}),
+            ("embedding_cache_misses_total", "counter", self.embedding_cache.misses, {}),
+            ("store_index_items", "gauge", snapshot.index.live_rows if snapshot.index is not None else 0, {}),
+            ("store_index_version", "gauge", snapshot.version, {}),
+            ("store_index_ranking_version", "gauge", snapshot.ranking_version, {}),
+        ]
+        if hasattr(self.embedder, "stats"):
+            stats = self.embedder.stats()
+            series += [
+                ("embedding_batches_total", "counter", stats["batches"], {}),
+                ("embedding_batched_texts_total", "counter", stats["texts"], {}),
+            ]
+        return series
+
+    def close(self):
+        self.store_index.stop_watcher()
+        if hasattr(self.embedder, "close"):
+            self.embedder.close()
+
+
+# ===================== ML SERVICE CLIENT =======================
+class RemoteML:
+    local = False
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._client = httpx.Client(
+            transport=httpx.HTTPTransport(uds=socket_path),
+            base_url="http://ml-service",
+            timeout=ML_SERVICE_TIMEOUT_SECONDS,
+        )
+        self._state = CatalogState(-1, -1)
+        self._instance = None
+        self._listeners = []
+        self._stop = threading.Event()
+        self._poller = None
+        self._poll_once()  # fail fast if the service isn't up yet
+
+    def encode(self, texts: list) -> np.ndarray:
+        response = self._client.post("/encode", json={"texts": list(texts)})
+        response.raise_for_status()
+        return unpack_vectors(response.json())
+
+    @property
+    def version(self) -> int:
+        """Last version seen by the poller (refreshed every ML_SERVICE_POLL_SECONDS)."""
+        if self._poller is None:
+            self._poll_once()
+        return self._state.version
+
+    @property
+    def ranking_version(self) -> int:
+        if self._poller is None:
+            self._poll_once()
+        return self._state.ranking_version
+
+    @property
+    def catalog_tag(self) -> str:
+        return f"{self._instance}.{self.ranking_version}"
+
+    def recommend(self, wishlist: list):
+        response = self._client.post("/recommend", json={"wishlist": wishlist})
+        response.raise_for_status()
+        body = response.json()
+        return body["version"], body["result"]
+
+    def subscribe(self, callback, ranking_only: bool = False):
+        """Call `callback(CatalogState)` whenever the service's catalog (ranking_only: ranking) version changes."""
+        self._listeners.append((callback, ranking_only))
+        if self._poller is None:
+            self._stop.clear()
+            self._poller = threading.Thread(target=self._poll, name="ml-service-poller", daemon=True)
+            self._poller.start()
+
+    def metrics(self) -> list:
+        """Embedding and index metrics live in ml_service.py's own /metrics."""
+        return []
+
+    def close(self):
+        self._stop.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+        self._client.close()
+
+    def _poll_once(self):
+        """Returns (catalog changed, ranking changed)."""
+        response = self._client.get("/version")
+        response.raise_for_status()
+        body = response.json()
+        previous = self._state
+        self._state = CatalogState(body["version"], body["rows_version"], body.get("ranking_version", 0))
+        self._instance = body.get("instance")
+        return self._state.version != previous.version, self._state.ranking_version != previous.ranking_version
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                changed, ranking_changed = self._poll_once()
+                for callback, ranking_only in self._listeners:
+                    if not (ranking_changed if ranking_only else changed):
+                        continue
+                    try:
+                        callback(self._state)
+                    except Exception as e:
+                        print("ML service listener error:", e)
+            except httpx.HTTPError as e:
+                print("ML service unreachable:", e)
+            self._stop.wait(ML_SERVICE_POLL_SECONDS)
+
+
+def create_ml():
+    """RemoteML when ML_SERVICE_SOCKET is set (multi-worker deployments), else LocalML."""
+    if ML_SERVICE_SOCKET:
+        return RemoteML(ML_SERVICE_SOCKET)
+    return LocalML()
+
+
+# ===================== BACKGROUND LOADING =======================
+class LazyML:
+    """
+    Builds the backend on a background thread so the API serves wishlist routes
+    while the model and index load. `get()` raises MLNotReady until it's done.
+    """
+
+    def __init__(self, factory=create_ml):
+        self.factory = factory
+        self.state = "not_started"   # -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+        self._backend = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._backend is not None
+
+    def start(self):
+        with self._lock:
+            if self.state in ("loading", "ready"):
+                return
+            self.state, self.error = "loading", None
+        threading.Thread(target=self._load, name="ml-loader", daemon=True).start()
+
+    def get(self):
+        if self._backend is None:
+            self.start()
+            raise MLNotReady(f"ML components are {self.state}" + (f": {self.error}" if self.error else ""))
+        return self._backend
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until loading finished (ready or failed); True if ready."""
+        self.start()
+        self._loaded.wait(timeout)
+        return self.ready
+
+    def subscribe(self, callback, ranking_only: bool = False):
+        """Forwarded to the backend once it exists."""
+        with self._lock:
+            if self._backend is None:
+                self._listeners.append((callback, ranking_only))
+                return
+        self._backend.subscribe(callback, ranking_only=ranking_only)
+
+    def close(self):
+        if self._backend is not None:
+            self._backend.close()
+
+    def status(self) -> dict:
+        return {"state": self.state, "error": self.error, "load_seconds": self.load_seconds}
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            backend = self.factory()
+        except Exception as e:
+            print("Loading ML components failed:", e)
+            with self._lock:
+                self.state, self.error = "failed", str(e)
+            self._loaded.set()
+            return
+
+        with self._lock:
+            self._backend = backend
+            listeners, self._listeners = self._listeners, []
+        for callback, ranking_only in listeners:
+            backend.subscribe(callback, ranking_only=ranking_only)
+        self.load_seconds = time.perf_counter() - started
+        self.state = "ready"
+        self._loaded.set()
+        print(f"ML components ready in {self.load_seconds:.1f}s")
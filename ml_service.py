@@ -0,0 +1,78 @@
+import argparse
+import os
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
+from ml_backend import LocalML, pack_vectors
+from timing import render_metrics
+
+# ml_service.py
+# One process that owns the embedding model and the store vector index for every
+# API worker on the machine. Workers started with ML_SERVICE_SOCKET pointing at
+# the same socket use it through ml_backend.RemoteML:
+#
+#   python ml_service.py --socket /tmp/ml.sock
+#   ML_SERVICE_SOCKET=/tmp/ml.sock uvicorn main:app --workers 8
+#
+# Endpoints are plain `def`, so FastAPI runs the CPU-bound work in its threadpool.
+
+ml = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ml
+    ml = LocalML()
+    yield
+    ml.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class EncodeRequest(BaseModel):
+    texts: list[str]
+
+
+class RecommendRequest(BaseModel):
+    wishlist: list[dict]
+
+
+@app.post("/encode")
+def encode(request: EncodeRequest):
+    return pack_vectors(ml.encode(request.texts))
+
+
+@app.post("/recommend")
+def recommend(request: RecommendRequest):
+    version, result = ml.recommend(request.wishlist)
+    return {"version": version, "result": result}
+
+
+@app.get("/version")
+def version():
+    snapshot = ml.store_index.snapshot
+    return {
+        "version": snapshot.version,
+        "rows_version": snapshot.rows_version,
+        "ranking_version": snapshot.ranking_version,
+        "instance": ml.instance,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: encode/search/rank spans, embedding cache and batching."""
+    return render_metrics(ml.metrics())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared embedding model + store index for API workers")
+    parser.add_argument("--socket", default=os.getenv("ML_SERVICE_SOCKET", "/tmp/voice-shopping-ml.sock"))
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    uvicorn.run(app, uds=args.socket, log_level="warning")
@@ -0,0 +1,147 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# parse_cache.py
+# Cache of LLM parse results for normalized voice commands.
+# Tier 1: exact match on the normalized text.
+# Tier 2 (optional): near-duplicate match with the MiniLM embedder. Only commands
+# with the same intent word and the same numbers are compared, so
+# "add 2 apples" can never be answered with the parse of "add 3 apples".
+
+NUMBER_WORDS = {"a", "an", "one", "two", "three", "four", "five", "six", "seven",
+                "eight", "nine", "ten", "eleven", "twelve", "dozen", "half"}
+INTENT_WORDS = {"add", "remove", "delete", "show"}
+
+
+def cache_key(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def command_signature(key: str) -> tuple:
+    tokens = re.findall(r"[a-z]+|\d+(?:\.\d+)?", key)
+    intent = next((t for t in tokens if t in INTENT_WORDS), "")
+    numbers = tuple(t for t in tokens if t[0].isdigit() or t in NUMBER_WORDS)
+    return intent, numbers
+
+
+class ParseCache:
+    def __init__(self, max_items: int = 10000, ttl: float = 3600, encode=None,
+                 similarity_threshold: float = 0.95):
+        """
+        encode: optional `encode(texts) -> np.ndarray` enabling the near-duplicate tier.
+        similarity_threshold: minimum cosine similarity for a near-duplicate hit.
+        """
+        self.max_items = max_items
+        self.ttl = ttl
+        self.encode = encode
+        self.similarity_threshold = similarity_threshold
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()   # key -> (response, expires_at)
+        self._vectors = {}              # key -> unit vector (near-duplicate tier only)
+        self._by_signature = {}         # signature -> set of keys
+        self._lock = threading.Lock()
+
+    @property
+    def semantic(self) -> bool:
+        return self.encode is not None
+
+    def get(self, text: str, similar_next: bool = False):
+        """
+        Exact-match lookup; cheap enough to call on the event loop.
+        similar_next: the caller follows a miss with get_similar(), which counts it instead.
+        """
+        key = cache_key(text)
+        with self._lock:
+            response = self._lookup(key)
+            if response is not None:
+                self.exact_hits += 1
+                return dict(response)
+            if not similar_next:
+                self.misses += 1
+        return None
+
+    def get_similar(self, text: str):
+        """Near-duplicate lookup (runs the embedder, so call it off the event loop)."""
+        if not self.semantic:
+            with self._lock:
+                self.misses += 1
+            return None
+        key = cache_key(text)
+        signature = command_signature(key)
+        with self._lock:
+            candidates = [k for k in self._by_signature.get(signature, ()) if k in self._vectors]
+        if not candidates:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        query = _unit(self.encode([key])[0])
+        with self._lock:
+            candidates = [k for k in candidates if k in self._vectors]
+            if candidates:
+                scores = np.vstack([self._vectors[k] for k in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    response = self._lookup(candidates[best])
+                    if response is not None:
+                        self.similar_hits += 1
+                        return dict(response)
+            self.misses += 1
+        return None
+
+    def put(self, text: str, response: dict, embed: bool = True):
+        """embed=False stores an exact-match-only entry (e.g. while the embedder is loading)."""
+        key = cache_key(text)
+        vector = _unit(self.encode([key])[0]) if self.semantic and embed else None
+        with self._lock:
+            self._entries[key] = (dict(response), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = vector
+                self._by_signature.setdefault(command_signature(key), set()).add(key)
+            while len(self._entries) > self.max_items:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.similar_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+        }
+
+    # caller holds self._lock
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, expires_at = entry
+        if expires_at < time.monotonic():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _evict(self, key: str):
+        self._entries.pop(key, None)
+        if self._vectors.pop(key, None) is not None:
+            keys = self._by_signature.get(command_signature(key))
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_signature[command_signature(key)]
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
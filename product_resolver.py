@@ -0,0 +1,149 @@
+import os
+import threading
+from pymongo import DESCENDING
+from rapidfuzz import fuzz, process
+from db import store_collection, product_key
+
+# product_resolver.py
+# Resident name -> store product lookup used by update_wishlist.
+# Exact match on the normalized name first, RapidFuzz fallback for spoken variations.
+# Names follow the store index snapshots; while no store index is running (lazy
+# ML load not started yet, or a failed load) they are re-read from MongoDB when
+# the catalog's stamp changes, checked every PRODUCT_RESOLVER_POLL_SECONDS.
+
+POLL_SECONDS = float(os.getenv("PRODUCT_RESOLVER_POLL_SECONDS", "30"))
+
+
+class ProductResolver:
+    def __init__(self, collection, score_cutoff: float = 60):
+        """
+        score_cutoff: minimum fuzz.ratio (0-100) for a fuzzy match,
+        same threshold as the old difflib cutoff of 0.6.
+        """
+        self.collection = collection
+        self.score_cutoff = score_cutoff
+        self._by_name = {}
+        self._names = []
+        self._loaded = False
+        self._loading = False
+        self._rows_version = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def rebuild(self, snapshot):
+        """
+        Store index listener: reuse the catalog already loaded for the vector index.
+        Snapshots from the ML service carry no products, so names are read from MongoDB.
+        """
+        if self._loaded and snapshot.rows_version == self._rows_version:
+            return  # only stock/prices changed
+        if snapshot.products is None:
+            self.refresh()
+        else:
+            self._load(zip(snapshot.ids, snapshot.products))
+        self._rows_version = snapshot.rows_version
+
+    def refresh(self):
+        """Reload names straight from MongoDB (used when no store index is running)."""
+        stamp = self._catalog_stamp()
+        docs = self.collection.find({}, {"_id": 1, "product": 1, "category": 1})
+        self._load((doc["_id"], doc) for doc in docs)
+        self._stamp = stamp
+
+    def start_polling(self, has_snapshots, interval: float = POLL_SECONDS):
+        """
+        Fallback for when no store index sends snapshots: every `interval` seconds,
+        unless has_snapshots() is True, refresh() if products were added, removed
+        or changed since the last load (count + newest `updated_at`).
+        """
+        if self._poller and self._poller.is_alive():
+            return self._poller
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, args=(has_snapshots, interval),
+                                        name="product-resolver-poller", daemon=True)
+        self._poller.start()
+        return self._poller
+
+    def stop_polling(self):
+        self._stop.set()
+
+    def _poll(self, has_snapshots, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                if not has_snapshots() and not self._loading and self._catalog_stamp() != self._stamp:
+                    self.refresh()
+            except Exception as e:
+                print("Product resolver poll failed:", e)
+
+    def _catalog_stamp(self):
+        newest = self.collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", DESCENDING)])
+        return self.collection.count_documents({}), (newest or {}).get("updated_at")
+
+    def load_in_background(self):
+        """refresh() on its own thread, unless one is already running."""
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._background_refresh, name="product-resolver-loader", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print("Loading product names failed:", e)
+        finally:
+            self._loading = False
+
+    def _load(self, rows):
+        by_name = {}
+        for product_id, product in rows:
+            key = product_key(product.get("product", ""))
+            if key and key not in by_name:
+                by_name[key] = {
+                    "_id": product_id,
+                    "product": product["product"],
+                    "category": product.get("category", "unknown"),
+                }
+        # Swap both together so lookups never see a half-built index
+        with self._lock:
+            self._by_name, self._names = by_name, list(by_name)
+            self._loaded = True
+
+    def resolve(self, query: str):
+        """Return {"_id", "product", "category"} of the closest store product, or None."""
+        item, _ = self.match(query)
+        return item
+
+    def match(self, query: str):
+        """
+        Like resolve(), but returns (item, score 0-100); exact name hits score 100.
+        Called from request handlers, so before the names are loaded it starts loading
+        them in the background and reports no match instead of scanning the store inline.
+        """
+        if not self._loaded:
+            self.load_in_background()
+            return None, 0.0
+
+        key = product_key(query)
+        with self._lock:
+            by_name, names = self._by_name, self._names
+
+        # Spoken plurals ("apples", "tomatoes") usually name a singular catalog entry
+        for candidate in (key, key[:-2] if key.endswith("es") else None, key[:-1] if key.endswith("s") else None):
+            if candidate and candidate in by_name:
+                return by_name[candidate], 100.0
+
+        match = process.extractOne(key, names, scorer=fuzz.ratio, score_cutoff=self.score_cutoff)
+        if match:
+            return by_name[match[0]], match[1]
+        return None, 0.0
+
+
+store_resolver = ProductResolver(store_collection)
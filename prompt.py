@@ -1,12 +1,9 @@
-import os
-import requests
 from dotenv import load_dotenv
 import json
+from llm_client import llm_client
 
 
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 def process_command(user_text: str):
     """
     Takes a shopping voice command as text and returns structured JSON
@@ -31,22 +28,14 @@ Return only valid JSON, no explanation.
 """
 
     try:
-        response = requests.post(
-            GROQ_API_URL,
-            headers={
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": "llama-3.3-70b-versatile",  # ✅ Groq recommended model
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.2
-            }
-        )
-
-        result = response.json()
+        # Pooled keep-alive client with timeouts, retries and a circuit breaker
+        result = llm_client.chat({
+            "model": "llama-3.3-70b-versatile",  # ✅ Groq recommended model
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.2
+        })
 
         if "choices" not in result or not result["choices"]:
             return {"error": "Unexpected response from Groq", "raw": result}
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+# recommendation_cache.py
+# Last /recommendations result per user, stamped with the user's wishlist_rev
+# (bumped by every wishlist write) and the store's ranking_version (bumped when
+# rows, the in-stock set, categories or prices change; plain stock counts don't).
+# An entry is only served while both still match, so invalidation is just a comparison.
+
+
+class RecommendationCache:
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # username -> (wishlist_rev, ranking_version, result)
+        self._lock = threading.Lock()
+
+    def get(self, username: str, wishlist_rev: int, ranking_version: int):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[0] == wishlist_rev and entry[1] == ranking_version:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        return None
+
+    def is_current(self, username: str, wishlist_rev: int, ranking_version: int) -> bool:
+        """Like get() without counting a hit/miss (used by background precompute)."""
+        with self._lock:
+            entry = self._entries.get(username)
+            return entry is not None and entry[0] == wishlist_rev and entry[1] == ranking_version
+
+    def put(self, username: str, wishlist_rev: int, ranking_version: int, result: dict):
+        with self._lock:
+            current = self._entries.get(username)
+            # A slow computation must not overwrite a newer one
+            if current is not None and current[0] >= wishlist_rev and current[1] >= ranking_version:
+                return
+            self._entries[username] = (wishlist_rev, ranking_version, result)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def active_users(self, limit: int) -> list:
+        """Most recently used usernames first."""
+        with self._lock:
+            return list(reversed(self._entries))[:limit]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
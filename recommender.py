@@ -0,0 +1,69 @@
+import numpy as np
+from timing import timed
+
+# recommender.py
+# Ranks store products for a wishlist. One batched FAISS search over the whole
+# wishlist matrix, then NumPy masks over the snapshot's per-row arrays.
+
+CANDIDATES_PER_ITEM = 20
+SAME_CATEGORY_BOOST = 0.8
+OTHER_CATEGORY_PENALTY = 1.2
+
+
+def _codes(lookup: dict, labels) -> np.ndarray:
+    return np.array([lookup[label] for label in labels if label in lookup], dtype=np.int64)
+
+
+def rank_recommendations(snapshot, wishlist_vectors, wishlist_products, wishlist_categories, limit: int = 10) -> list:
+    """
+    snapshot: StoreSnapshot from store_index.
+    wishlist_products / wishlist_categories: lowercased names and categories.
+    Returns up to `limit` product dicts (smaller score = better match).
+    """
+    if snapshot.index is None or snapshot.index.live_rows == 0:
+        return []
+
+    vectors = np.ascontiguousarray(wishlist_vectors, dtype="float32")
+    k = min(CANDIDATES_PER_ITEM, snapshot.index.live_rows)
+    with timed("recommend.search"):
+        distances, indices = snapshot.index.search(vectors, k)
+
+    rows = indices.ravel()
+    dists = distances.ravel()
+    hit = rows >= 0
+    rows, dists = rows[hit], dists[hit]
+
+    wishlist_name_codes = _codes(snapshot.name_lookup, wishlist_products)
+    wishlist_category_codes = _codes(snapshot.category_lookup, wishlist_categories)
+
+    names = snapshot.name_codes[rows]
+    keep = ~np.isin(names, wishlist_name_codes) & (snapshot.quantities[rows] > 0)
+    rows, dists, names = rows[keep], dists[keep], names[keep]
+    if rows.size == 0:
+        return []
+
+    same_category = np.isin(snapshot.category_codes[rows], wishlist_category_codes)
+    scores = dists * np.where(same_category, SAME_CATEGORY_BOOST, OTHER_CATEGORY_PENALTY)
+
+    # Best score per product name: sort by (name, score) and keep the first of each name
+    order = np.lexsort((scores, names))
+    _, first = np.unique(names[order], return_index=True)
+    best = order[first]
+    best = best[np.argsort(scores[best], kind="stable")]
+
+    ranked_rows = rows[best].tolist()
+    ranked_same = same_category[best].tolist()
+
+    # Hybrid strategy: 2 same-category, then related categories up to 4, then fill by score
+    same = [r for r, s in zip(ranked_rows, ranked_same) if s][:2]
+    related = [r for r, s in zip(ranked_rows, ranked_same) if not s][:4 - len(same)]
+    picked = same + related
+    chosen = set(picked)
+    for r in ranked_rows:
+        if len(picked) >= limit:
+            break
+        if r not in chosen:
+            picked.append(r)
+            chosen.add(r)
+
+    return [snapshot.products[r] for r in picked[:limit]]
@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+from starlette.responses import Response
+
+# responses.py
+# HTTP plumbing for the hot read routes (/wishlist, /recommendations):
+#   json_response      - JSON bytes via orjson (falls back to json) with no jsonable_encoder pass
+#   etag_matches / not_modified - version-based conditional GETs (304)
+#   CompressionMiddleware - brotli (if installed) or gzip for bodies above COMPRESSION_MIN_BYTES
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+# ===================== JSON =======================
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def json_response(content, etag: str = None, status_code: int = 200) -> Response:
+    """
+    Returning a Response skips FastAPI's jsonable_encoder walk over the body.
+    With an etag, browsers and the frontend revalidate on every read (no-cache)
+    instead of reusing a stale copy.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else {"Cache-Control": "no-store"}
+    return Response(dumps(content), status_code=status_code, media_type="application/json", headers=headers)
+
+
+# ===================== CONDITIONAL GET =======================
+def etag_matches(request, etag: str) -> bool:
+    """Weak comparison against If-None-Match (compressed and plain bodies share one ETag)."""
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+# ===================== COMPRESSION =======================
+def _choose_encoding(scope):
+    accepted = ""
+    for key, value in scope.get("headers") or []:
+        if key == b"accept-encoding":
+            accepted = value.decode("latin-1").lower()
+            break
+    encodings = set()
+    for part in accepted.split(","):
+        name, _, params = part.partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=")) if params.strip().startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            encodings.add(name.strip())
+    if brotli is not None and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresses single-message responses (every JSON route here); streamed
+    responses and 304s pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = _choose_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held until the body shows whether it's worth compressing
+                return
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            headers = start.get("headers", [])
+            body = message.get("body", b"")
+            if not message.get("more_body") and len(body) >= self.minimum_size and self._compressible(headers):
+                body = _compress(body, encoding)
+                vary = [v for k, v in headers if k == b"vary"]
+                headers = [(k, v) for k, v in headers if k not in (b"content-length", b"vary")]
+                headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode()),
+                            (b"vary", b", ".join(vary + [b"Accept-Encoding"]))]
+                message = {**message, "body": body}
+            await send({**start, "headers": headers})
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+        if start is not None:  # response without a body message
+            await send(start)
+
+    @staticmethod
+    def _compressible(headers) -> bool:
+        content_type = b""
+        for key, value in headers:
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").startswith(COMPRESSIBLE_TYPES)
@@ -1,4 +1,4 @@
-from db import store_collection
+from catalog_import import import_rows, print_report
 
 # products = [
 #     # Dairy
@@ -89,10 +89,10 @@ products = [
 ]
 
 
-for product in products:
-    if not store_collection.find_one({"product": product["product"]}):
-        store_collection.insert_one(product)
-        print(f"✅ Inserted {product['product']}")
-    else:
-        print(f"⚠️ Skipped {product['product']} (already exists)")
-
+if __name__ == "__main__":
+    # One bulk upsert; products already in the store are left as they are
+    report = import_rows(
+        ((product["product"], product) for product in products),
+        insert_only=True,
+    )
+    print_report(report)
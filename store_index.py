@@ -0,0 +1,372 @@
+import copy
+import hashlib
+import threading
+import numpy as np
+from pymongo.errors import PyMongoError, OperationFailure
+from vector_index import VectorIndex, build_index, rows_fingerprint, choose_index_type, COMPACT_RATIO, INDEX_TYPE
+
+# store_index.py
+# Keeps the FAISS index over the store catalog in memory. Vectors are keyed by
+# product id so catalog changes only re-encode the products that changed, and
+# every rebuild is published as a new snapshot so readers never see a half-built index.
+# New products are appended to a copy of the current index; deleted or renamed
+# ones leave a dead row (REMOVED_ROW, never recommended) until dead rows pass
+# COMPACT_RATIO and the index is rebuilt.
+# The FAISS backend itself (flat / HNSW / IVF, optional on-disk copy) lives in vector_index.py.
+
+STORE_PROJECTION = {"product": 1, "category": 1, "price": 1, "quantity": 1, "updated_at": 1}
+PRIVATE_FIELDS = ("_id", "updated_at")
+REMOVED_ROW = {"product": "", "category": "", "quantity": 0}  # out of stock, so filtered out of results
+
+
+def public_product(doc: dict) -> dict:
+    """Keep only the catalog fields that can be returned to the frontend."""
+    return {k: doc[k] for k in STORE_PROJECTION if k in doc and k not in PRIVATE_FIELDS}
+
+
+def encode_labels(labels: list):
+    """Map strings to dense int codes: returns (codes array, {label: code})."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(label, len(lookup)) for label in labels), dtype=np.int64, count=len(labels))
+    return codes, lookup
+
+
+class StoreSnapshot:
+    """
+    Immutable view of the catalog at one point in time.
+    Row i of `index` belongs to products[i] / ids[i] (Mongo `_id`; REMOVED_ROW / None
+    for a dead row); the per-row arrays below let the recommender filter and score
+    search hits without a Python loop.
+    """
+
+    def __init__(self, index, products: list, ids: list, version: int, rows_version: int = 0,
+                 ranking_version: int = 0):
+        """
+        version: bumped by every catalog change (stock and price included).
+        rows_version: bumped only when products are added, removed or renamed.
+        ranking_version: bumped only when recommendation results can change (see
+        ranking_fingerprint); StoreIndexManager sets it when publishing.
+        """
+        self.index = index
+        self.products = products
+        self.ids = ids
+        self.version = version
+        self.rows_version = rows_version
+        self.ranking_version = ranking_version
+
+        self.name_codes, self.name_lookup = encode_labels(
+            [str(p.get("product", "")).lower() for p in products]
+        )
+        self.category_codes, self.category_lookup = encode_labels(
+            [str(p.get("category", "")).lower() for p in products]
+        )
+        self.quantities = np.array([p.get("quantity") or 0 for p in products], dtype=np.float64)
+        self.prices = np.array([p.get("price") or 0 for p in products], dtype=np.float64)
+        self.ranking_fingerprint = self._ranking_fingerprint()
+
+    def with_updates(self, changes: dict, version: int) -> "StoreSnapshot":
+        """
+        Copy with the products of some rows replaced ({row: product}), for stock,
+        price and category updates that keep every row's name and vector. Only
+        the changed rows are re-encoded, so a reservation doesn't redo the whole catalog.
+        """
+        snapshot = copy.copy(self)
+        snapshot.version = version
+        snapshot.products = list(self.products)
+        snapshot.quantities, snapshot.prices = self.quantities.copy(), self.prices.copy()
+        snapshot.category_codes = self.category_codes.copy()
+        for row, product in changes.items():
+            snapshot.products[row] = product
+            snapshot.quantities[row] = product.get("quantity") or 0
+            snapshot.prices[row] = product.get("price") or 0
+            category = str(product.get("category", "")).lower()
+            if category not in snapshot.category_lookup:
+                if snapshot.category_lookup is self.category_lookup:
+                    snapshot.category_lookup = dict(self.category_lookup)
+                snapshot.category_lookup[category] = len(snapshot.category_lookup)
+            snapshot.category_codes[row] = snapshot.category_lookup[category]
+        snapshot.ranking_fingerprint = snapshot._ranking_fingerprint()
+        return snapshot
+
+    def _ranking_fingerprint(self) -> str:
+        """
+        Hash of everything a recommendation result depends on: the rows, which of
+        them are in stock, their categories and their prices (shown in the result).
+        Stock counts that stay above zero are left out, so reservations don't count.
+        """
+        digest = hashlib.blake2b(str(self.rows_version).encode(), digest_size=16)
+        digest.update(np.packbits(self.quantities > 0).tobytes())
+        digest.update(self.category_codes.tobytes())
+        digest.update("\0".join(self.category_lookup).encode())
+        digest.update(self.prices.tobytes())
+        return digest.hexdigest()
+
+
+def _on_ranking_change(callback):
+    """Wrap a snapshot listener so it only sees snapshots with a new ranking_version."""
+    last = None
+
+    def listener(snapshot):
+        nonlocal last
+        if snapshot.ranking_version != last:
+            last = snapshot.ranking_version
+            callback(snapshot)
+
+    return listener
+
+
+class StoreIndexManager:
+    """
+    Builds the store index once and keeps it in sync with `store_collection`.
+
+    Changes are picked up from a MongoDB change stream when the server supports
+    it (replica set / Atlas), otherwise by polling the `updated_at` stamp of
+    every product. Writers must bump `updated_at` for polling to notice them.
+    """
+
+    def __init__(self, collection, encode, poll_interval: float = 30, use_change_stream: bool = True,
+                 index_dir: str = None):
+        """
+        index_dir: where full builds are written and loaded from, so workers with the same
+        catalog skip the build (only IVF indexes are also shared in memory, see vector_index.py).
+        """
+        self.collection = collection
+        self.encode = encode
+        self.poll_interval = poll_interval
+        self.use_change_stream = use_change_stream
+        self.index_dir = index_dir
+
+        self._raw_ids = {}    # product id -> Mongo _id
+        self._products = {}   # product id -> public product dict
+        self._vectors = {}    # product id -> embedding of product name
+        self._stamps = {}     # product id -> last seen updated_at
+        self._snapshot = StoreSnapshot(None, [], [], 0)
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._listeners = []
+        self._rows_changed = True  # vectors added/removed/renamed since the last index build
+        self._rows = []            # index row -> product id (None: dead row)
+        self._row_of = {}          # product id -> index row
+        self._stale = set()        # product ids whose indexed vector is for an old name
+        self._updated = set()      # product ids changed without a new vector since the last publish
+        self._built_kind = None    # choose_index_type() at the last full build
+
+    @property
+    def snapshot(self) -> StoreSnapshot:
+        return self._snapshot
+
+    # ===================== BUILD / SYNC =======================
+    def build(self) -> StoreSnapshot:
+        """Full load of the catalog; only used at startup."""
+        docs = list(self.collection.find({}, STORE_PROJECTION))
+        with self._write_lock:
+            self._raw_ids, self._products, self._vectors, self._stamps = {}, {}, {}, {}
+            self._rows, self._row_of, self._stale, self._updated = [], {}, set(), set()
+            self._built_kind = None  # forces a full build
+            self._rows_changed = True
+            self._apply(docs, set())
+            self._publish()
+        return self._snapshot
+
+    def sync(self) -> bool:
+        """
+        Polling diff: compare `updated_at` stamps with what is indexed,
+        fetch only new/changed products and drop deleted ones.
+        Returns True if a new snapshot was published.
+        """
+        current = {}
+        for doc in self.collection.find({}, {"_id": 1, "updated_at": 1}):
+            current[str(doc["_id"])] = (doc["_id"], doc.get("updated_at"))
+
+        changed_ids = [
+            raw_id for pid, (raw_id, stamp) in current.items()
+            if pid not in self._stamps or self._stamps[pid] != stamp
+        ]
+        deleted = set(self._stamps) - set(current)
+
+        upserts = []
+        if changed_ids:
+            upserts = list(self.collection.find({"_id": {"$in": changed_ids}}, STORE_PROJECTION))
+
+        return self.apply_changes(upserts, deleted)
+
+    def apply_changes(self, upserts: list, deleted_ids) -> bool:
+        """Apply inserted/updated product documents and deleted ids, then swap in a new snapshot."""
+        if not upserts and not deleted_ids:
+            return False
+        with self._write_lock:
+            self._apply(upserts, set(deleted_ids))
+            self._publish()
+        print(f"Store index updated: {len(upserts)} upserted, {len(deleted_ids)} deleted, "
+              f"{len(self._products)} products (v{self._snapshot.version})")
+        return True
+
+    def _apply(self, upserts: list, deleted_ids: set):
+        for pid in deleted_ids:
+            if pid in self._products:
+                self._rows_changed = True
+            self._raw_ids.pop(pid, None)
+            self._products.pop(pid, None)
+            self._vectors.pop(pid, None)
+            self._stamps.pop(pid, None)
+
+        to_encode = []
+        for doc in upserts:
+            pid = str(doc["_id"])
+            product = public_product(doc)
+            old = self._products.get(pid)
+            # Stock / price changes keep the existing vector
+            if old is None or old.get("product") != product.get("product") or pid not in self._vectors:
+                to_encode.append(pid)
+            else:
+                self._updated.add(pid)
+            self._raw_ids[pid] = doc["_id"]
+            self._products[pid] = product
+            self._stamps[pid] = doc.get("updated_at")
+
+        if to_encode:
+            self._rows_changed = True
+            vectors = self.encode([self._products[pid]["product"] for pid in to_encode])
+            for pid, vec in zip(to_encode, np.asarray(vectors, dtype="float32")):
+                self._vectors[pid] = vec
+            self._stale.update(pid for pid in to_encode if pid in self._row_of)
+
+    def _publish(self):
+        previous = self._snapshot
+        updated, self._updated = self._updated, set()
+        if self._rows_changed:
+            index = self._update_rows(previous.index)
+            self._rows_changed = False
+            products = [self._products[pid] if pid is not None else REMOVED_ROW for pid in self._rows]
+            ids = [self._raw_ids[pid] if pid is not None else None for pid in self._rows]
+            snapshot = StoreSnapshot(index, products, ids, previous.version + 1, previous.rows_version + 1)
+        else:
+            # Stock / price updates keep the same rows: same index, only those rows change
+            snapshot = previous.with_updates(
+                {self._row_of[pid]: self._products[pid] for pid in updated if pid in self._row_of},
+                previous.version + 1,
+            )
+        snapshot.ranking_version = previous.ranking_version + int(
+            snapshot.ranking_fingerprint != previous.ranking_fingerprint
+        )
+        # Single reference assignment: readers see either the old or the new snapshot
+        self._snapshot = snapshot
+
+        for callback in self._listeners:
+            try:
+                callback(self._snapshot)
+            except Exception as e:
+                print("Store index listener error:", e)
+
+    def _update_rows(self, index):
+        """Index for the current products: the old one plus appended rows, or a full rebuild."""
+        dropped = {pid for pid in self._row_of if pid not in self._products} | self._stale
+        added = [pid for pid in self._products if pid not in self._row_of or pid in self._stale]
+        dead = len(self._rows) - len(self._row_of) + len(dropped)
+        total = len(self._rows) + len(added)
+        self._stale = set()
+
+        if (index is not None and self._products and dead <= COMPACT_RATIO * total
+                and choose_index_type(len(self._products), INDEX_TYPE) == self._built_kind):
+            # Dead rows stay in FAISS but are excluded from searches
+            new_index = index.without_rows([self._row_of[pid] for pid in dropped]) if dropped else index
+            if added:
+                try:
+                    new_index = new_index.with_rows(np.vstack([self._vectors[pid] for pid in added]))
+                except RuntimeError as e:  # e.g. a memory-mapped IVF index FAISS can't copy
+                    print("Store index append failed, rebuilding:", e)
+                    new_index = None
+            if new_index is not None:
+                rows = list(self._rows)
+                for pid in dropped:
+                    rows[self._row_of.pop(pid)] = None
+                for pid in added:
+                    self._row_of[pid] = len(rows)
+                    rows.append(pid)
+                self._rows = rows
+                return new_index
+
+        keys = list(self._products)
+        self._rows, self._row_of = keys, {pid: row for row, pid in enumerate(keys)}
+        self._built_kind = choose_index_type(len(keys), INDEX_TYPE)
+        return self._build_index(keys) if keys else None
+
+    def _build_index(self, keys: list) -> VectorIndex:
+        fingerprint = None
+        if self.index_dir:
+            fingerprint = rows_fingerprint(keys, [self._products[pid].get("product") for pid in keys])
+            index = VectorIndex.load(self.index_dir, fingerprint)
+            if index is not None:
+                print(f"Loaded {index.kind} store index from {self.index_dir}")
+                return index
+
+        index = build_index(np.vstack([self._vectors[pid] for pid in keys]))
+        if fingerprint:
+            try:
+                index.save(self.index_dir, fingerprint)
+            except OSError as e:
+                print("Could not save store index:", e)
+        return index
+
+    def subscribe(self, callback, ranking_only: bool = False):
+        """
+        Call `callback(snapshot)` after every published snapshot (and once now).
+        ranking_only: only after snapshots that change ranking_version, so stock
+        updates from wishlist reservations don't reach it.
+        """
+        if ranking_only:
+            callback = _on_ranking_change(callback)
+        self._listeners.append(callback)
+        if self._snapshot.version:
+            callback(self._snapshot)
+
+    # ===================== WATCHER =======================
+    def start_watcher(self):
+        """Start the background thread that keeps the index up to date."""
+        if self._watcher and self._watcher.is_alive():
+            return self._watcher
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="store-index-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+
+    def _watch(self):
+        use_change_stream = self.use_change_stream
+        while not self._stop.is_set():
+            try:
+                if use_change_stream:
+                    self._follow_change_stream()
+                else:
+                    self.sync()
+                    self._stop.wait(self.poll_interval)
+            except OperationFailure as e:
+                # Standalone servers do not support change streams
+                print("Change streams unavailable, polling store instead:", e)
+                use_change_stream = False
+            except PyMongoError as e:
+                print("Store index watcher error:", e)
+                self._stop.wait(self.poll_interval)
+
+    def _follow_change_stream(self):
+        with self.collection.watch(full_document="updateLookup", max_await_time_ms=1000) as stream:
+            # Catch anything that changed before the stream was opened
+            self.sync()
+            while not self._stop.is_set() and stream.alive:
+                upserts, deleted = {}, set()
+                change = stream.try_next()
+                while change is not None:
+                    pid = str(change["documentKey"]["_id"])
+                    if change["operationType"] == "delete":
+                        upserts.pop(pid, None)
+                        deleted.add(pid)
+                    elif change.get("fullDocument"):
+                        deleted.discard(pid)
+                        upserts[pid] = change["fullDocument"]
+                    change = stream.try_next()
+                self.apply_changes(list(upserts.values()), deleted)
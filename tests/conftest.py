@@ -0,0 +1,69 @@
+import asyncio
+import inspect
+import os
+import sys
+
+# Tests run against the in-memory MongoDB stand-in (requirements-dev.txt);
+# db.py reads this at import time, so it is set before any app module is imported.
+os.environ["MONGO_URI"] = "mongomock://"
+os.environ["MONGO_DB_NAME"] = "wishlist_test"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import db
+import helper_function
+from product_resolver import store_resolver
+
+STORE = [
+    {"_id": "milk", "product": "Milk", "category": "dairy", "quantity": 100},
+    {"_id": "bread", "product": "Bread", "category": "bakery", "quantity": 100},
+    {"_id": "eggs", "product": "Eggs", "category": "dairy", "quantity": 100},
+]
+
+
+class RoundTripCollection:
+    """
+    Async collection that yields to the event loop before every call, like a
+    network round trip. mongomock-motor never suspends, so without this
+    asyncio.gather would run "concurrent" writes one after the other.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0)
+            return await attr(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Fresh users/store/history collections with STORE loaded into the resolver."""
+    for collection in (db.user_collection, db.store_collection, db.history_collection):
+        collection.delete_many({})
+    db.user_collection.create_index("username", unique=True, name="username_unique")
+    db.store_collection.insert_many([{**item, "product_key": db.product_key(item["product"])} for item in STORE])
+    store_resolver.refresh()
+
+    monkeypatch.setattr(helper_function, "async_user_collection", RoundTripCollection(db.async_user_collection))
+    monkeypatch.setattr(helper_function, "async_store_collection", RoundTripCollection(db.async_store_collection))
+    return db.store_collection
+
+
+def command(product: str, quantity: int = 1, action: str = "add") -> dict:
+    return {"product": product, "quantity": quantity, "category": "unknown", "action": action, "status": "test"}
+
+
+def stock(product_id: str) -> int:
+    return db.store_collection.find_one({"_id": product_id})["quantity"]
+
+
+def wishlist(username: str) -> dict:
+    user = db.user_collection.find_one({"username": username}) or {}
+    return {line["product"]: line for line in user.get("wishlist", [])}
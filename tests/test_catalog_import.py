@@ -0,0 +1,19 @@
+from catalog_import import import_rows
+
+
+def test_import_updates_products_seeded_without_product_key(store):
+    # Stores seeded by the old seed_store.py have no product_key
+    store.delete_many({})
+    store.insert_many([
+        {"product": "Milk", "category": "dairy", "price": 2, "quantity": 10},
+        {"product": "Green Apple", "category": "fruit", "price": 1, "quantity": 5},
+    ])
+
+    report = import_rows([
+        ("feed:2", {"product": "milk", "category": "dairy", "price": "3", "quantity": "20"}),
+        ("feed:3", {"product": "Green  Apple", "category": "fruit", "price": "1", "quantity": "7"}),
+    ])
+
+    assert (report["inserted"], report["updated"]) == (0, 2)
+    assert store.count_documents({}) == 2
+    assert {doc["product_key"]: doc["quantity"] for doc in store.find()} == {"milk": 20, "green apple": 7}
@@ -0,0 +1,45 @@
+from command_parser import parse_locally, parse_items
+from helper_function import normalize_user_text
+
+
+def parse(text: str):
+    return parse_locally(normalize_user_text(text))
+
+
+def items(text: str):
+    action, parsed = parse_items(normalize_user_text(text))
+    return action, [(p["product"], p["quantity"], p["action"]) if p else None for _, p in parsed]
+
+
+def test_simple_commands_parse_locally(store):
+    assert parse("add 2 kg of bread to my list please")["product"] == "Bread"
+    assert parse("add 2 kg of bread to my list please")["quantity"] == 2
+    assert parse("I need a dozen eggs")["quantity"] == 12
+    assert parse("remove two milk from my cart")["action"] == "remove"
+
+
+def test_delete_keeps_its_intent_through_normalization(store):
+    assert normalize_user_text("delete milk") == "delete milk from list"
+    assert parse("delete milk")["action"] == "delete"
+    assert parse("please delete the milk from my list")["action"] == "delete"
+    assert parse("take out milk")["action"] == "remove"
+
+
+def test_items_after_a_list_phrase_are_not_dropped(store):
+    assert parse("add milk to my list and bread to my list") is None
+    assert parse("add milk to my list and two eggs") is None
+    assert items("add milk to my list and bread to my list") == ("add", [("Milk", 1, "add"), ("Bread", 1, "add")])
+    assert items("add milk to my list and two eggs") == ("add", [("Milk", 1, "add"), ("Eggs", 2, "add")])
+
+
+def test_multi_item_commands_split(store):
+    assert items("add milk, two eggs and bread to my list") == (
+        "add", [("Milk", 1, "add"), ("Eggs", 2, "add"), ("Bread", 1, "add")],
+    )
+    assert items("delete milk and eggs") == ("delete", [("Milk", 1, "delete"), ("Eggs", 1, "delete")])
+
+
+def test_unknown_or_chatty_text_goes_to_the_llm(store):
+    assert parse("add something nice for dinner") is None
+    assert parse("what should I cook tonight") is None
+    assert items("show my list") == (None, [])
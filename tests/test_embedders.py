@@ -0,0 +1,59 @@
+import threading
+import time
+import numpy as np
+import pytest
+from embedders import BatchingEmbedder, HashEmbedder
+
+
+class SlowEmbedder(HashEmbedder):
+    """HashEmbedder that takes `seconds_per_text` per text, and records its batch sizes."""
+
+    def __init__(self, seconds_per_text: float):
+        super().__init__(dim=8)
+        self.seconds_per_text = seconds_per_text
+        self.batch_sizes = []
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        time.sleep(self.seconds_per_text * len(texts))
+        self.batch_sizes.append(len(texts))
+        return super().encode(texts)
+
+
+def test_big_calls_outlast_the_timeout_while_they_make_progress():
+    model = SlowEmbedder(0.01)  # 400 texts: 4 s of work, 0.4 s per chunk
+    batcher = BatchingEmbedder(model, max_batch=40, max_wait_ms=1, timeout=1)
+    texts = [f"product {i}" for i in range(400)]
+    small = {}
+
+    def small_request():
+        time.sleep(0.5)
+        started = time.monotonic()
+        small["vectors"] = batcher.encode(["milk"])
+        small["seconds"] = time.monotonic() - started
+
+    thread = threading.Thread(target=small_request)
+    thread.start()
+    vectors = batcher.encode(texts)
+    thread.join()
+    batcher.close()
+
+    np.testing.assert_allclose(vectors, HashEmbedder(dim=8).encode(texts))
+    np.testing.assert_allclose(small["vectors"], HashEmbedder(dim=8).encode(["milk"]))
+    # The small request ran between two chunks instead of after all of them
+    assert small["seconds"] < 1.5
+    assert max(model.batch_sizes) <= 41
+
+
+def test_waiting_fails_when_the_batching_thread_makes_no_progress():
+    release = threading.Event()
+
+    class StuckEmbedder(HashEmbedder):
+        def encode(self, texts, convert_to_numpy=True, **kwargs):
+            release.wait()
+            return super().encode(texts)
+
+    batcher = BatchingEmbedder(StuckEmbedder(dim=8), max_batch=4, max_wait_ms=1, timeout=0.3)
+    with pytest.raises(TimeoutError):
+        batcher.encode(["milk"])
+    release.set()
+    batcher.close()
@@ -0,0 +1,113 @@
+import asyncio
+import random
+import pytest
+import db
+import history
+from history import read_history, record_event, record_events, migrate_legacy_history
+
+
+def event(n: int, timestamp: str) -> dict:
+    return {"product": f"p{n}", "action": "remove", "timestamp": timestamp}
+
+
+async def read_all(username: str, limit: int, max_pages: int = 500) -> list:
+    events, before = [], None
+    for _ in range(max_pages):
+        page = await read_history(username, limit=limit, before=before)
+        events += page["history"]
+        before = page["next_before"]
+        if not before:
+            return events
+    raise AssertionError(f"paging didn't end after {max_pages} pages")
+
+
+def assert_complete_newest_first(events: list, expected: list):
+    assert sorted(e["product"] for e in events) == sorted(e["product"] for e in expected)
+    timestamps = [e["timestamp"] for e in events]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 50])
+def test_paging_across_overlapping_buckets_with_shared_timestamps(store, limit):
+    # Legacy and spilled buckets overlap in time, and ties sit on page and bucket boundaries
+    buckets = [
+        [event(0, "T00"), event(1, "T01"), event(2, "T05"), event(3, "T07"), event(4, "T08")],
+        [event(5, "T03"), event(6, "T05"), event(7, "T05"), event(8, "T06")],
+        [event(9, "T08"), event(10, "T09"), event(11, "T09"), event(12, "T09")],
+        [event(13, "T09")],
+    ]
+    db.history_collection.insert_many([
+        {"username": "alice", "day": "d", "first": b[0]["timestamp"], "last": b[-1]["timestamp"],
+         "count": history.BUCKET_SIZE, "events": b}
+        for b in buckets
+    ])
+
+    events = asyncio.run(read_all("alice", limit))
+
+    assert_complete_newest_first(events, [e for b in buckets for e in b])
+
+
+def test_a_plain_timestamp_cursor_returns_strictly_older_events(store):
+    asyncio.run(record_events("bob", [event(0, "T01"), event(1, "T02"), event(2, "T02"), event(3, "T03")]))
+
+    page = asyncio.run(read_history("bob", before="T02"))
+
+    assert [e["product"] for e in page["history"]] == ["p0"]
+    assert page["next_before"] is None
+
+
+def test_spilled_batches_keep_buckets_bounded_and_pages_complete(store, monkeypatch):
+    monkeypatch.setattr(history, "BUCKET_SIZE", 3)
+    rng = random.Random(5)
+    recorded = []
+
+    async def go():
+        n = 0
+        for _ in range(15):
+            batch = [event(n + i, f"2024-05-01T10:{rng.randint(0, 9):02d}") for i in range(rng.randint(1, 4))]
+            n += len(batch)
+            recorded.extend(batch)
+            if len(batch) == 1:
+                await record_event("carol", batch[0])
+            else:
+                await record_events("carol", batch)
+        return [await read_all("carol", limit) for limit in (1, 2, 5)]
+
+    pages = asyncio.run(go())
+
+    assert all(len(b["events"]) <= 3 for b in db.history_collection.find({"username": "carol"}))
+    for events in pages:
+        assert_complete_newest_first(events, recorded)
+
+
+def test_a_spilled_batch_closes_the_partly_filled_bucket(store, monkeypatch):
+    monkeypatch.setattr(history, "BUCKET_SIZE", 3)
+
+    async def go():
+        await record_event("dave", event(0, "2024-05-01T10:00"))
+        await record_events("dave", [event(1, "2024-05-01T10:01"), event(2, "2024-05-01T10:01"),
+                                     event(3, "2024-05-01T10:02")])
+        await record_event("dave", event(4, "2024-05-01T10:03"))
+
+    asyncio.run(go())
+
+    # Later events don't go back into the old bucket, so bucket time ranges don't overlap
+    buckets = db.history_collection.find({"username": "dave"}).sort("first", 1)
+    assert [[e["product"] for e in b["events"]] for b in buckets] == [["p0"], ["p1", "p2", "p3"], ["p4"]]
+
+
+def test_legacy_history_is_migrated_once_by_concurrent_workers(store):
+    db.user_collection.insert_many([
+        {"username": f"user{u}", "wishlist": [], "historylist": [event(i, f"2024-05-0{1 + i % 3}T10:00") for i in range(7)]}
+        for u in range(5)
+    ])
+
+    async def go():
+        return await asyncio.gather(migrate_legacy_history(batch_size=2), migrate_legacy_history(batch_size=2))
+
+    migrated = asyncio.run(go())
+
+    assert sum(migrated) == 5
+    assert db.user_collection.count_documents({"historylist": {"$exists": True}}) == 0
+    for u in range(5):
+        assert len(asyncio.run(read_all(f"user{u}", 50))) == 7
@@ -0,0 +1,42 @@
+import time
+from llm_client import CircuitBreaker
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure(breaker.allow())
+    assert breaker.allow() is None
+    time.sleep(0.06)
+    return breaker
+
+
+def test_only_one_trial_while_half_open():
+    breaker = open_breaker()
+    assert breaker.allow() == "half-open"
+    assert breaker.allow() is None
+
+
+def test_calls_started_before_opening_dont_free_the_trial_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    early = breaker.allow()
+    breaker.record_failure(breaker.allow())
+    time.sleep(0.06)
+
+    trial = breaker.allow()
+    assert (early, trial) == ("closed", "half-open")
+    breaker.release(early)
+    assert breaker.allow() is None
+    breaker.record_failure(early)
+    time.sleep(0.06)
+    assert breaker.allow() is None  # the trial is still running
+
+    breaker.record_success(trial)
+    breaker.release(trial)
+    assert breaker.state == "closed"
+
+
+def test_a_trial_without_an_outcome_frees_the_slot():
+    breaker = open_breaker()
+    trial = breaker.allow()
+    breaker.release(trial)  # e.g. cancelled mid-call
+    assert breaker.allow() == "half-open"
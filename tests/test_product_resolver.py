@@ -0,0 +1,32 @@
+import datetime
+import time
+import mongomock
+from product_resolver import ProductResolver
+
+
+def wait_for(condition, seconds: float = 2) -> bool:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_names_are_polled_while_no_store_index_runs():
+    collection = mongomock.MongoClient().db.store
+    collection.insert_one({"product": "Milk", "category": "dairy", "updated_at": datetime.datetime(2024, 1, 1)})
+    resolver = ProductResolver(collection)
+    resolver.refresh()
+    has_snapshots = [False]
+    resolver.start_polling(lambda: has_snapshots[0], interval=0.05)
+    try:
+        collection.insert_one({"product": "Oat Milk", "category": "dairy", "updated_at": datetime.datetime(2024, 1, 2)})
+        assert wait_for(lambda: resolver.resolve("oat milk"))
+
+        # Once snapshots arrive they are the only source of names
+        has_snapshots[0] = True
+        collection.insert_one({"product": "Paneer", "category": "dairy", "updated_at": datetime.datetime(2024, 1, 3)})
+        assert not wait_for(lambda: resolver.resolve("paneer"), seconds=0.3)
+    finally:
+        resolver.stop_polling()
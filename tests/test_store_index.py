@@ -0,0 +1,98 @@
+import random
+import mongomock
+import numpy as np
+import pytest
+import store_index
+from embedders import HashEmbedder
+from store_index import StoreIndexManager, StoreSnapshot
+
+WORDS = ["fresh", "green", "milk", "apple", "bread", "juice", "cheese", "rice", "tea", "chips", "oat", "mango"]
+
+
+def product(rng: random.Random, pid: int) -> dict:
+    name = " ".join(rng.sample(WORDS, 3)) + f" {pid}"
+    return {"_id": pid, "product": name, "category": rng.choice(["a", "b", "c"]), "quantity": 5, "price": 1}
+
+
+def search(snapshot, embedder, query: str, k: int = 10):
+    distances, rows = snapshot.index.search(embedder.encode([query]), k)
+    return [snapshot.products[row]["product"] for row in rows[0] if row >= 0], distances[0]
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw"])
+def test_incremental_index_searches_like_a_fresh_build(monkeypatch, kind):
+    monkeypatch.setattr(store_index, "INDEX_TYPE", kind)
+    rng = random.Random(3)
+    embedder = HashEmbedder(dim=64)
+    collection = mongomock.MongoClient().db.store
+    collection.insert_many([product(rng, pid) for pid in range(300)])
+    manager = StoreIndexManager(collection, embedder.encode, use_change_stream=False)
+    manager.build()
+
+    next_id = 300
+    for _ in range(40):
+        alive = [doc["_id"] for doc in collection.find({}, {"_id": 1})]
+        change = rng.choice(["add", "delete", "rename"])
+        if change == "add":
+            doc = product(rng, next_id)
+            next_id += 1
+            collection.insert_one(doc)
+            manager.apply_changes([doc], [])
+        elif change == "delete":
+            pid = rng.choice(alive)
+            collection.delete_one({"_id": pid})
+            manager.apply_changes([], [str(pid)])
+        else:
+            doc = product(rng, rng.choice(alive))
+            collection.replace_one({"_id": doc["_id"]}, doc)
+            manager.apply_changes([doc], [])
+
+    incremental = manager.snapshot
+    fresh = StoreIndexManager(collection, embedder.encode, use_change_stream=False).build()
+    assert len(incremental.products) > len(fresh.products)  # dead rows are still in there
+    assert incremental.index.live_rows == fresh.index.ntotal
+
+    for query in ["green milk", "fresh apple juice", "rice tea", "mango chips oat"]:
+        results, distances = search(incremental, embedder, query)
+        fresh_results, fresh_distances = search(fresh, embedder, query)
+        assert len(results) == 10 and all(results)  # no dead row comes back
+        if kind == "flat":
+            # Exact search: the same neighbours (ties may come back in another order)
+            np.testing.assert_allclose(distances, fresh_distances, rtol=1e-5)
+        else:
+            assert len(set(results) & set(fresh_results)) >= 8
+
+
+def test_stock_and_price_updates_only_touch_their_rows():
+    embedder = HashEmbedder(dim=16)
+    collection = mongomock.MongoClient().db.store
+    collection.insert_many([
+        {"_id": 1, "product": "Milk", "category": "dairy", "quantity": 5, "price": 2},
+        {"_id": 2, "product": "Bread", "category": "bakery", "quantity": 3, "price": 1},
+        {"_id": 3, "product": "Eggs", "category": "dairy", "quantity": 9, "price": 4},
+    ])
+    manager = StoreIndexManager(collection, embedder.encode, use_change_stream=False)
+    before = manager.build()
+
+    # A reservation: stock stays above zero, so rankings can't change
+    manager.apply_changes([{"_id": 2, "product": "Bread", "category": "bakery", "quantity": 2, "price": 1}], [])
+    reserved = manager.snapshot
+    assert reserved.index is before.index and reserved.name_codes is before.name_codes
+    assert (reserved.version, reserved.rows_version, reserved.ranking_version) == (
+        before.version + 1, before.rows_version, before.ranking_version,
+    )
+    assert reserved.products[1]["quantity"] == 2 and before.products[1]["quantity"] == 3
+
+    # Out of stock, a new price and a new category all change rankings
+    manager.apply_changes([
+        {"_id": 1, "product": "Milk", "category": "dairy", "quantity": 0, "price": 2},
+        {"_id": 3, "product": "Eggs", "category": "breakfast", "quantity": 9, "price": 5},
+    ], [])
+    updated = manager.snapshot
+    assert updated.ranking_version == reserved.ranking_version + 1
+
+    full = StoreSnapshot(updated.index, updated.products, updated.ids, updated.version, updated.rows_version)
+    np.testing.assert_array_equal(updated.quantities, full.quantities)
+    np.testing.assert_array_equal(updated.prices, full.prices)
+    labels = {code: label for label, code in updated.category_lookup.items()}
+    assert [labels[code] for code in updated.category_codes] == ["dairy", "bakery", "breakfast"]
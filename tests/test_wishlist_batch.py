@@ -0,0 +1,91 @@
+import asyncio
+import helper_function
+from conftest import command, stock, wishlist
+from helper_function import update_wishlist, update_wishlist_batch
+
+
+def interleave_write(monkeypatch, times: int):
+    """Make the first `times` guarded batch writes race with a single add of Bread."""
+    original = helper_function._write_wishlist
+    calls = []
+
+    async def racing_write(username, user, lines):
+        calls.append(user.get("wishlist_rev") if user else None)
+        if len(calls) <= times:
+            await update_wishlist(username, command("bread"))
+        return await original(username, user, lines)
+
+    monkeypatch.setattr(helper_function, "_write_wishlist", racing_write)
+    return calls
+
+
+def test_batch_returns_one_result_per_command_in_order(store):
+    asyncio.run(update_wishlist("alice", command("eggs", 2)))
+
+    result = asyncio.run(update_wishlist_batch("alice", [
+        command("milk", 2),
+        {"product": "milk"},
+        command("xylophone"),
+        command("eggs", 1, "remove"),
+        command("butter", 1, "remove"),
+    ]))
+
+    assert (result["applied"], result["failed"]) == (2, 3)
+    assert [r.get("message") or r.get("error") for r in result["results"]] == [
+        "Product 'Milk' added to wishlist",
+        "Invalid LLM response",
+        "No similar item found in store for 'xylophone'",
+        "Product 'Eggs' removed from wishlist",
+        "No matching product found in wishlist for 'butter'",
+    ]
+    assert {name: line["quantity"] for name, line in wishlist("alice").items()} == {"Eggs": 1, "Milk": 2}
+    assert stock("milk") == 98
+    assert stock("eggs") == 99
+
+
+def test_batch_recomputes_after_a_concurrent_write(store, monkeypatch):
+    asyncio.run(update_wishlist("bob", command("eggs")))
+    calls = interleave_write(monkeypatch, times=1)
+
+    result = asyncio.run(update_wishlist_batch("bob", [command("milk", 2), command("bread", 1, "remove")]))
+
+    # First write lost the wishlist_rev race; the retry sees the concurrent Bread and removes it
+    assert calls == [1, 2]
+    assert [r.get("message") or r.get("error") for r in result["results"]] == [
+        "Product 'Milk' added to wishlist",
+        "Product 'Bread' removed from wishlist",
+    ]
+    assert {name: line["quantity"] for name, line in wishlist("bob").items()} == {"Eggs": 1, "Milk": 2}
+    assert store.database["users"].find_one({"username": "bob"})["wishlist_rev"] == 3
+    assert stock("milk") == 98
+    assert stock("bread") == 100
+
+
+def test_batch_gives_up_and_releases_stock_when_every_write_races(store, monkeypatch):
+    asyncio.run(update_wishlist("carol", command("eggs")))
+    calls = interleave_write(monkeypatch, times=helper_function.BATCH_WRITE_ATTEMPTS)
+
+    result = asyncio.run(update_wishlist_batch("carol", [command("milk", 3), command("eggs", 1, "remove")]))
+
+    assert result == {"error": "Wishlist is being changed concurrently, try again"}
+    assert len(calls) == helper_function.BATCH_WRITE_ATTEMPTS
+    # Only the racing writes landed: the batch's Milk reservation was handed back
+    assert {name: line["quantity"] for name, line in wishlist("carol").items()} == {
+        "Eggs": 1, "Bread": helper_function.BATCH_WRITE_ATTEMPTS,
+    }
+    assert stock("milk") == 100
+    assert stock("eggs") == 99
+
+
+def test_concurrent_batches_for_one_user_all_apply(store):
+    async def go():
+        return await asyncio.gather(*(
+            update_wishlist_batch("dave", [command("milk"), command("eggs", 2)]) for _ in range(4)
+        ))
+
+    results = asyncio.run(go())
+
+    assert all(result["applied"] == 2 for result in results)
+    assert {name: line["quantity"] for name, line in wishlist("dave").items()} == {"Milk": 4, "Eggs": 8}
+    assert stock("milk") == 96
+    assert stock("eggs") == 92
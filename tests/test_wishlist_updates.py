@@ -0,0 +1,99 @@
+import asyncio
+from conftest import command, stock, wishlist
+from helper_function import update_wishlist, migrate_duplicate_wishlist_lines
+
+
+def test_concurrent_adds_merge_into_one_line(store):
+    async def go():
+        return await asyncio.gather(*(update_wishlist("alice", command("milk")) for _ in range(20)))
+
+    results = asyncio.run(go())
+
+    assert all("error" not in result for result in results)
+    assert [line["product"] for line in wishlist("alice").values()] == ["Milk"]
+    assert wishlist("alice")["Milk"]["quantity"] == 20
+    assert wishlist("alice")["Milk"]["reserved"] == 20
+    assert store.count_documents({}) == 3
+    assert stock("milk") == 80
+
+
+def test_concurrent_adds_of_different_products_all_land(store):
+    async def go():
+        return await asyncio.gather(*(update_wishlist("bob", command(name, 2)) for name in ("milk", "bread", "eggs") * 3))
+
+    asyncio.run(go())
+
+    user = store.database["users"].find_one({"username": "bob"})
+    assert {name: line["quantity"] for name, line in wishlist("bob").items()} == {"Milk": 6, "Bread": 6, "Eggs": 6}
+    assert user["wishlist_rev"] == 9
+
+
+def test_reservations_never_take_stock_below_zero(store):
+    store.update_one({"_id": "milk"}, {"$set": {"quantity": 5}})
+
+    async def go():
+        return await asyncio.gather(*(update_wishlist("carol", command("milk")) for _ in range(12)))
+
+    results = asyncio.run(go())
+
+    assert sum("error" not in result for result in results) == 5
+    assert all(result["error"] == "Only 0 × Milk available in store" for result in results if "error" in result)
+    assert stock("milk") == 0
+    assert wishlist("carol")["Milk"]["quantity"] == 5
+
+
+def test_removing_more_than_the_line_releases_only_its_reservation(store):
+    async def go():
+        await update_wishlist("dave", command("milk", 3))
+        return await update_wishlist("dave", command("milk", 5, "remove"))
+
+    result = asyncio.run(go())
+
+    assert "error" not in result
+    assert wishlist("dave") == {}
+    assert stock("milk") == 100
+
+
+def test_removing_an_unreserved_line_gives_no_stock_back(store):
+    # Lines written before reservations existed have no `reserved` count
+    store.database["users"].insert_one({"username": "erin", "wishlist": [
+        {"product": "Milk", "quantity": 4, "category": "dairy"},
+    ]})
+
+    result = asyncio.run(update_wishlist("erin", command("milk", 1, "remove")))
+
+    assert "error" not in result
+    assert wishlist("erin")["Milk"]["quantity"] == 3
+    assert wishlist("erin")["Milk"]["reserved"] == 0
+    assert stock("milk") == 100
+
+
+def test_duplicate_legacy_lines_are_merged_before_line_updates(store):
+    # Before merge_wishlist_line every add pushed its own line
+    store.database["users"].insert_one({"username": "frank", "wishlist": [
+        {"product": "Milk", "quantity": 1, "category": "dairy", "timestamp": "2024-01-01T10:00:00"},
+        {"product": "Bread", "quantity": 1, "category": "bakery", "timestamp": "2024-01-01T10:01:00"},
+        {"product": "Milk", "quantity": 1, "reserved": 1, "category": "dairy", "timestamp": "2024-01-02T10:00:00"},
+        {"product": "Milk", "quantity": 2, "reserved": 2, "category": "dairy", "timestamp": "2024-01-03T10:00:00"},
+    ]})
+
+    async def go():
+        # Two workers starting at once, while the user is adding
+        merged = await asyncio.gather(
+            migrate_duplicate_wishlist_lines(),
+            migrate_duplicate_wishlist_lines(),
+            update_wishlist("frank", command("bread")),
+        )
+        removed = await update_wishlist("frank", command("milk", 1, "remove"))
+        return merged, removed
+
+    (first, second, _), removed = asyncio.run(go())
+
+    assert first + second == 1
+    assert "error" not in removed
+    assert [line["product"] for line in wishlist("frank").values()] == ["Milk", "Bread"]
+    assert wishlist("frank")["Milk"]["quantity"] == 3
+    assert wishlist("frank")["Milk"]["reserved"] == 3
+    assert wishlist("frank")["Milk"]["timestamp"] == "2024-01-03T10:00:00"
+    assert wishlist("frank")["Bread"]["quantity"] == 2
+    assert asyncio.run(migrate_duplicate_wishlist_lines()) == 0
@@ -0,0 +1,197 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# timing.py
+# Latency spans, request IDs and Prometheus metrics for the request pipeline.
+#   timed(stage)     - span around one stage (transcribe, parse.llm, recommend.search...).
+#                      Feeds the stage histogram, the current request's log line and the
+#                      raw sample windows benchmark.py reads.
+#   count / observe  - counters and histograms (upstream errors, request latency...)
+#   RequestContextMiddleware - request ID (X-Request-ID in and out), per-route latency
+#                      histogram and one log line per request listing its spans
+#   render_metrics() - Prometheus text format for /metrics
+#   log(*args)       - print() prefixed with the current request ID
+# Metrics are per process: with several uvicorn workers each one reports its own.
+
+MAX_SAMPLES = 20000
+METRICS_PREFIX = "voice_shopping_"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOG_REQUESTS = os.getenv("LOG_REQUEST_SPANS", "1") == "1"
+QUIET_PATHS = {"/health", "/ready", "/metrics"}
+
+_samples = {}
+_histograms = {}   # name -> {labels: [bucket counts..., +Inf count, sum]}
+_counters = {}     # name -> {labels: value}
+_lock = threading.Lock()
+
+# (request id, [(stage, seconds), ...]) for the request being handled
+_request = contextvars.ContextVar("request", default=None)
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+# ===================== RECORDING =======================
+def observe(name: str, seconds: float, **labels):
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        values = series.get(_labels(labels))
+        if values is None:
+            values = series[_labels(labels)] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        values[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        values[-1] += seconds
+
+
+def count(name: str, amount: float = 1, **labels):
+    with _lock:
+        series = _counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+
+def record(stage: str, seconds: float):
+    with _lock:
+        window = _samples.get(stage)
+        if window is None:
+            window = _samples[stage] = deque(maxlen=MAX_SAMPLES)
+        window.append(seconds)
+    observe("stage_duration_seconds", seconds, stage=stage)
+    current = _request.get()
+    if current is not None:
+        current[1].append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def samples() -> dict:
+    """{stage: [seconds, ...]} copy of the current windows."""
+    with _lock:
+        return {stage: list(window) for stage, window in _samples.items()}
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+
+
+# ===================== REQUEST CONTEXT =======================
+def request_id():
+    current = _request.get()
+    return current[0] if current else None
+
+
+def log(*args):
+    current = _request.get()
+    if current is None:
+        print(*args)
+    else:
+        print(f"[{current[0]}]", *args)
+
+
+def _incoming_request_id(scope) -> str:
+    for key, value in scope.get("headers") or []:
+        if key == b"x-request-id":
+            # Keep a caller's ID (proxy, frontend) if it looks sane
+            value = value.decode("latin-1")[:64]
+            if value.isprintable() and value.strip():
+                return value.strip()
+    return uuid.uuid4().hex[:16]
+
+
+class RequestContextMiddleware:
+    """Plain ASGI middleware, so it adds no per-request task or body buffering."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        rid = _incoming_request_id(scope)
+        spans = []
+        token = _request.set((rid, spans))
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Route template ("/wishlist/{username}"), not the raw path, keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if scope["type"] == "http":
+                observe("http_request_duration_seconds", elapsed, method=scope["method"], route=route, status=status)
+                count("http_requests_total", method=scope["method"], route=route, status=status)
+            if LOG_REQUESTS and scope["path"] not in QUIET_PATHS:
+                stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in spans)
+                log(f"{scope.get('method', 'WS')} {route} {status if scope['type'] == 'http' else ''} "
+                    f"{elapsed * 1000:.1f}ms {stages}".rstrip())
+            _request.reset(token)
+
+
+# ===================== EXPOSITION =======================
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(extra: list = ()) -> str:
+    """
+    Prometheus text exposition of everything recorded here plus `extra`:
+    (name, "counter" | "gauge", value, labels dict) tuples read at scrape time
+    (cache statistics and the like).
+    """
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            full = METRICS_PREFIX + name
+            lines.append(f"# TYPE {full} histogram")
+            for labels, values in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket in zip((*LATENCY_BUCKETS, "+Inf"), values[:-1]):
+                    cumulative += bucket
+                    lines.append(f"{full}_bucket{_format_labels((*labels, ('le', str(bound))))} {cumulative}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {values[-1]!r}")
+                lines.append(f"{full}_count{_format_labels(labels)} {cumulative}")
+        for name, series in sorted(_counters.items()):
+            full = METRICS_PREFIX + name
+            lines.append(f"# TYPE {full} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{full}{_format_labels(labels)} {_number(value)}")
+
+    typed = set()
+    for name, kind, value, labels in extra:
+        full = METRICS_PREFIX + name
+        if full not in typed:
+            lines.append(f"# TYPE {full} {kind}")
+            typed.add(full)
+        lines.append(f"{full}{_format_labels(_labels(labels))} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import tempfile
+import assemblyai as aai
+from dotenv import load_dotenv
+from upstream import transcription_upstream
+
+# transcription.py
+# Speech-to-text engines behind one interface.
+#   transcribe(audio)          -> whole clip at once (POST /recognise_text_to_llm)
+#   create_session(...)        -> incremental session fed chunk by chunk (WebSocket)
+# TRANSCRIPTION_ENGINE=assemblyai (default) talks to AssemblyAI; "local" is a
+# stand-in for tests and benchmarks that treats audio bytes as UTF-8 text.
+
+load_dotenv()
+
+ENGINE = os.getenv("TRANSCRIPTION_ENGINE", "assemblyai").lower()
+LOCAL_LATENCY = float(os.getenv("LOCAL_TRANSCRIPTION_LATENCY", "0"))
+STREAM_MAX_SECONDS = float(os.getenv("TRANSCRIPTION_STREAM_MAX_SECONDS", "120"))
+
+aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
+
+
+class TranscriptionError(Exception):
+    pass
+
+
+# ===================== WHOLE CLIP =======================
+def transcribe_file(audio: bytes) -> str:
+    """Blocking AssemblyAI call; always run through transcription_upstream."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
+        temp_file.write(audio)
+        temp_path = temp_file.name
+    try:
+        # AssemblyAI transcription (English only)
+        transcriber = aai.Transcriber()
+        transcript = transcriber.transcribe(
+            temp_path,
+            config=aai.TranscriptionConfig(language_code="en")
+        )
+    finally:
+        os.remove(temp_path)
+
+    if transcript.status == aai.TranscriptStatus.error:
+        raise TranscriptionError(transcript.error)
+    return transcript.text or ""
+
+
+async def transcribe(audio: bytes) -> str:
+    if ENGINE == "local":
+        if LOCAL_LATENCY:
+            await asyncio.sleep(LOCAL_LATENCY)
+        return audio.decode("utf-8", errors="ignore").strip()
+    return await transcription_upstream.run(transcribe_file, audio)
+
+
+# ===================== STREAMING =======================
+class BufferedSession:
+    """
+    For containers AssemblyAI can't stream (browser webm/opus): collect chunks
+    as they arrive and transcribe the clip once the client stops.
+    """
+
+    def __init__(self, on_partial):
+        self.on_partial = on_partial
+        self._audio = bytearray()
+
+    async def start(self):
+        pass
+
+    async def feed(self, chunk: bytes):
+        self._audio.extend(chunk)
+
+    async def finish(self) -> str:
+        return await transcribe(bytes(self._audio))
+
+    async def close(self):
+        self._audio = bytearray()
+
+
+class LocalSession:
+    """Stand-in engine: every chunk is UTF-8 text and extends the running transcript."""
+
+    def __init__(self, on_partial):
+        self.on_partial = on_partial
+        self._words = []
+
+    async def start(self):
+        pass
+
+    async def feed(self, chunk: bytes):
+        if LOCAL_LATENCY:
+            await asyncio.sleep(LOCAL_LATENCY)
+        words = chunk.decode("utf-8", errors="ignore").split()
+        if words:
+            self._words.extend(words)
+            await self.on_partial(" ".join(self._words), False)
+
+    async def finish(self) -> str:
+        text = " ".join(self._words)
+        if text:
+            await self.on_partial(text, True)
+        return text
+
+    async def close(self):
+        pass
+
+
+class AssemblyAIStreamingSession:
+    """
+    AssemblyAI real-time (v3) session for raw 16-bit PCM. Turn events arrive on
+    the SDK's reader thread and are handed back to the event loop as partials.
+    """
+
+    def __init__(self, on_partial, sample_rate: int):
+        self.on_partial = on_partial
+        self.sample_rate = sample_rate
+        self._turns = {}
+        self._error = None
+        self._client = None
+        self._loop = None
+
+    async def start(self):
+        from assemblyai.streaming.v3 import (
+            StreamingClient, StreamingClientOptions, StreamingEvents, StreamingParameters,
+        )
+
+        self._loop = asyncio.get_running_loop()
+        self._client = StreamingClient(StreamingClientOptions(api_key=aai.settings.api_key))
+        self._client.on(StreamingEvents.Turn, self._on_turn)
+        self._client.on(StreamingEvents.Error, self._on_error)
+        await transcription_upstream.run(
+            self._client.connect,
+            StreamingParameters(sample_rate=self.sample_rate, format_turns=True),
+        )
+
+    async def feed(self, chunk: bytes):
+        if self._error:
+            raise TranscriptionError(self._error)
+        self._client.stream(chunk)  # only queues the chunk for the SDK's writer thread
+
+    async def finish(self) -> str:
+        # Graceful terminate waits for the final turn to be delivered
+        await transcription_upstream.run(self._client.disconnect, terminate=True)
+        self._client = None
+        if self._error:
+            raise TranscriptionError(self._error)
+        return self.text
+
+    async def close(self):
+        if self._client is not None:
+            await transcription_upstream.run(self._client.disconnect)
+            self._client = None
+
+    @property
+    def text(self) -> str:
+        return " ".join(t for _, t in sorted(self._turns.items()) if t).strip()
+
+    # SDK reader thread
+    def _on_turn(self, client, event):
+        self._turns[event.turn_order] = event.transcript
+        text = self.text
+        self._loop.call_soon_threadsafe(
+            lambda: asyncio.ensure_future(self.on_partial(text, event.end_of_turn))
+        )
+
+    def _on_error(self, client, error):
+        self._error = str(error)
+
+
+def create_session(on_partial, encoding: str = "webm", sample_rate: int = 16000):
+    """
+    on_partial: `async on_partial(text, end_of_turn)` called with the transcript so far.
+    encoding: "pcm_s16le" streams to AssemblyAI in real time; anything else is buffered.
+    """
+    if ENGINE == "local":
+        return LocalSession(on_partial)
+    if encoding == "pcm_s16le":
+        return AssemblyAIStreamingSession(on_partial, sample_rate)
+    return BufferedSession(on_partial)
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from timing import count, observe
+
+# upstream.py
+# Runs blocking calls to external services (AssemblyAI, Groq) off the event loop.
+# Each upstream gets its own bounded thread pool, a concurrency limit and a
+# per-call timeout, so one slow provider can't stall the loop or starve the other.
+# Every call is counted by outcome (ok / error / timeout) for /metrics.
+
+
+class UpstreamTimeout(Exception):
+    pass
+
+
+class Upstream:
+    def __init__(self, name: str, max_concurrency: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Await `fn(*args, **kwargs)` in this upstream's pool.
+        The timeout covers waiting for a free slot plus the call itself.
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await asyncio.wait_for(self._run(partial(fn, *args, **kwargs)), self.timeout)
+            outcome = "ok"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise UpstreamTimeout(f"{self.name} timed out after {self.timeout:g}s")
+        finally:
+            count("upstream_calls_total", upstream=self.name, outcome=outcome)
+            observe("upstream_duration_seconds", time.perf_counter() - started, upstream=self.name)
+
+    async def _run(self, call):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, call)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+transcription_upstream = Upstream(
+    "assemblyai",
+    max_concurrency=int(os.getenv("TRANSCRIPTION_MAX_CONCURRENCY", "32")),
+    timeout=float(os.getenv("TRANSCRIPTION_TIMEOUT_SECONDS", "60")),
+)
+
+llm_upstream = Upstream(
+    "groq",
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+    timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "20")),
+)
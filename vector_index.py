@@ -0,0 +1,193 @@
+import hashlib
+import os
+import numpy as np
+import faiss
+
+# vector_index.py
+# FAISS backends for the store index. Small catalogs use an exact flat scan;
+# larger ones switch to HNSW or IVF(-PQ) so query cost and memory stop growing
+# linearly with the catalog. Every backend answers search() with squared-L2-style
+# distances (smaller = closer), which is what the recommender's scoring expects.
+#
+#   STORE_INDEX_TYPE=auto|flat|hnsw|ivf|ivfpq
+#   STORE_INDEX_METRIC=l2|ip  (ip = inner product on normalized vectors)
+
+INDEX_TYPE = os.getenv("STORE_INDEX_TYPE", "auto").lower()
+METRIC = os.getenv("STORE_INDEX_METRIC", "l2").lower()
+FLAT_MAX_ITEMS = int(os.getenv("STORE_INDEX_FLAT_MAX_ITEMS", "50000"))
+HNSW_MAX_ITEMS = int(os.getenv("STORE_INDEX_HNSW_MAX_ITEMS", "1000000"))
+# Share of dead rows (deleted / renamed products) at which an incrementally grown index is rebuilt
+COMPACT_RATIO = float(os.getenv("STORE_INDEX_COMPACT_RATIO", "0.2"))
+HNSW_M = int(os.getenv("STORE_INDEX_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("STORE_INDEX_HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("STORE_INDEX_IVF_NPROBE", "16"))
+PQ_SUBVECTOR_DIM = 8  # 384-d MiniLM -> 48 sub-quantizers of 8 bits
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "ivfpq")
+
+
+def choose_index_type(n_items: int, kind: str = "auto") -> str:
+    if kind != "auto":
+        return kind
+    if n_items <= FLAT_MAX_ITEMS:
+        return "flat"
+    if n_items <= HNSW_MAX_ITEMS:
+        return "hnsw"
+    return "ivfpq"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.array(matrix, dtype="float32", copy=True)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+class VectorIndex:
+    """
+    Thin wrapper over a FAISS index: `ntotal` and `search(vectors, k) -> (distances, rows)`,
+    the same interface as a raw faiss.IndexFlatL2. `dead` rows (deleted or renamed
+    products of an incrementally grown index) are never returned.
+    """
+
+    def __init__(self, index, kind: str, metric: str, dead=None):
+        self.index = index
+        self.kind = kind
+        self.metric = metric
+        self.dead = np.unique(np.asarray(dead if dead is not None else [], dtype="int64"))
+        self._params = self._search_params() if len(self.dead) else None
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def live_rows(self) -> int:
+        return self.index.ntotal - len(self.dead)
+
+    def search(self, vectors, k: int):
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        if self.metric == "ip":
+            similarities, rows = self.index.search(normalize_rows(vectors), k, params=self._params)
+            # For unit vectors ||a - b||^2 = 2 - 2 a.b
+            return 2.0 - 2.0 * similarities, rows
+        return self.index.search(vectors, k, params=self._params)
+
+    def without_rows(self, rows) -> "VectorIndex":
+        """The same FAISS index with `rows` excluded from searches (no copy)."""
+        return VectorIndex(self.index, self.kind, self.metric, np.concatenate([self.dead, np.asarray(rows, "int64")]))
+
+    def _search_params(self):
+        # The selectors are referenced from here: FAISS params don't keep them alive
+        self._selectors = (faiss.IDSelectorBatch(self.dead),)
+        self._selectors += (faiss.IDSelectorNot(self._selectors[0]),)
+        selector = self._selectors[1]
+        # Passing params replaces the index's own search knobs, so repeat them
+        if self.kind == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=HNSW_EF_SEARCH)
+        if self.kind in ("ivf", "ivfpq"):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    def with_rows(self, matrix: np.ndarray) -> "VectorIndex":
+        """
+        A copy with `matrix` appended as new rows; this index keeps serving searches.
+        Copy + add is a memory copy plus work for the new rows only, where a rebuild
+        re-inserts every row (for HNSW, 50k rows: ~0.1 s instead of ~30 s).
+        """
+        index = faiss.clone_index(self.index)
+        if len(matrix):
+            matrix = np.ascontiguousarray(matrix, dtype="float32")
+            index.add(normalize_rows(matrix) if self.metric == "ip" else matrix)
+        _tune(index, self.kind)
+        return VectorIndex(index, self.kind, self.metric, self.dead)
+
+    # ===================== PERSISTENCE =======================
+    # Files are named after the rows they were built from, so a worker can only
+    # ever load an index that matches its own catalog. FAISS only memory-maps the
+    # inverted lists of IVF indexes: flat and HNSW indexes (the auto choice up to
+    # HNSW_MAX_ITEMS) are read into each worker's own memory, so for them the file
+    # saves the build, not RAM. To keep one copy for many workers, run ml_service.py.
+    def save(self, directory: str, fingerprint: str):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{fingerprint}.{self.kind}.{self.metric}.faiss")
+        tmp = f"{path}.tmp{os.getpid()}"
+        faiss.write_index(self.index, tmp)
+        os.replace(tmp, path)
+        # Older builds are no longer needed; workers that still map one keep their pages
+        for name in os.listdir(directory):
+            if name.endswith(".faiss") and not name.startswith(fingerprint):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return path
+
+    @classmethod
+    def load(cls, directory: str, fingerprint: str):
+        """Load the saved index for these rows (IVF lists memory-mapped), or None if there isn't one."""
+        try:
+            names = [n for n in os.listdir(directory) if n.startswith(fingerprint + ".") and n.endswith(".faiss")]
+        except OSError:
+            return None
+        if not names:
+            return None
+        path = os.path.join(directory, names[0])
+        _, kind, metric, _ = names[0].split(".")
+        try:
+            # IVF inverted lists stay on disk, shared between workers through the page cache;
+            # FAISS ignores the flag for flat and HNSW and reads them into memory
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = faiss.read_index(path)
+        _tune(index, kind)
+        return cls(index, kind, metric)
+
+
+def build_index(matrix: np.ndarray, kind: str = INDEX_TYPE, metric: str = METRIC) -> VectorIndex:
+    """Build the backend for `kind` ("auto" picks by catalog size) over the rows of `matrix`."""
+    matrix = np.ascontiguousarray(matrix, dtype="float32")
+    n, dim = matrix.shape
+    kind = choose_index_type(n, kind)
+    if metric == "ip":
+        matrix = normalize_rows(matrix)
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+
+    nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))  # FAISS wants ~39 training points per list
+    if kind in ("ivf", "ivfpq") and nlist < 2:
+        print(f"Too few products ({n}) for an IVF index, using flat")
+        kind = "flat"
+
+    if kind == "flat":
+        index = faiss.IndexFlat(dim, faiss_metric)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss_metric)
+    elif kind in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlat(dim, faiss_metric)
+        if kind == "ivfpq" and dim % PQ_SUBVECTOR_DIM == 0 and n >= 256 * 39:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, dim // PQ_SUBVECTOR_DIM, 8, faiss_metric)
+        else:
+            kind = "ivf"
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss_metric)
+        index.train(matrix)
+    else:
+        raise ValueError(f"Unknown index type {kind!r}, expected one of {INDEX_TYPES} or 'auto'")
+
+    index.add(matrix)
+    _tune(index, kind)
+    return VectorIndex(index, kind, metric)
+
+
+def _tune(index, kind: str):
+    """Search-time knobs (not all of them survive write_index/read_index)."""
+    if kind == "hnsw":
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind in ("ivf", "ivfpq"):
+        index.nprobe = min(IVF_NPROBE, index.nlist)
+
+
+def rows_fingerprint(keys: list, names: list, kind: str = INDEX_TYPE, metric: str = METRIC) -> str:
+    """Identifies the rows an index was built from (product ids + names, in row order)."""
+    digest = hashlib.sha1(f"{kind}|{metric}|{len(keys)}".encode())
+    for key, name in zip(keys, names):
+        digest.update(f"\0{key}\0{name}".encode())
+    return digest.hexdigest()